@@ -2,14 +2,27 @@ import pandas as pd
 import geopandas as gpd
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import Dash, dcc, html, Input, Output, State, ctx
+from dash import Dash, dcc, html, Input, Output, State, ctx, Patch
+from dash.exceptions import PreventUpdate
+from flask import Response, abort, request
 import dash_bootstrap_components as dbc
+from plotly.colors import sample_colorscale
+from plotly.io.json import to_json_plotly
 from plotly.subplots import make_subplots
 import numpy as np
 import json
+import gc
+import hashlib
 import warnings
 import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from urllib.parse import urlencode
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
 
 warnings.filterwarnings('ignore')
 BASE_DIR = Path(__file__).resolve().parent
@@ -245,11 +258,494 @@ for partido in ['PAN', 'PRI', 'PRD', 'MORENA', 'PVEM', 'PT', 'MC']:
         'uso': 'Identificar ciclos y tendencias de largo plazo'
     }
 
+# ============================================================================
+# CÁLCULOS VECTORIZADOS
+# ============================================================================
+def calcular_ranking(votos, nombres, sin_datos='SIN_DATOS'):
+    """Primer y segundo lugar por fila sobre una matriz de votos (filas x opciones).
+    
+    Los empates se resuelven a favor de la primera opción en `nombres`, igual que
+    max() sobre un dict. Las filas sin votos quedan con `sin_datos` como ganador.
+    """
+    votos = np.nan_to_num(np.asarray(votos, dtype='float64'), nan=0.0)
+    nombres = np.asarray(nombres, dtype=object)
+    filas = np.arange(len(votos))
+    
+    if votos.shape[1] == 0:
+        vacio = np.zeros(len(votos))
+        return {
+            'ganador': np.full(len(votos), sin_datos, dtype=object),
+            'segundo': np.full(len(votos), 'N/A', dtype=object),
+            'votos_ganador': vacio, 'votos_segundo': vacio, 'total': vacio, 'margen': vacio
+        }
+    
+    idx_ganador = votos.argmax(axis=1)
+    votos_ganador = votos[filas, idx_ganador]
+    
+    if votos.shape[1] > 1:
+        resto = votos.copy()
+        resto[filas, idx_ganador] = -np.inf
+        idx_segundo = resto.argmax(axis=1)
+        votos_segundo = votos[filas, idx_segundo]
+        segundo = nombres[idx_segundo]
+    else:
+        votos_segundo = np.zeros(len(votos))
+        segundo = np.full(len(votos), 'N/A', dtype=object)
+    
+    con_votos = votos_ganador > 0
+    
+    return {
+        'ganador': np.where(con_votos, nombres[idx_ganador], sin_datos),
+        'segundo': np.where(con_votos, segundo, 'N/A'),
+        'votos_ganador': np.where(con_votos, votos_ganador, 0.0),
+        'votos_segundo': np.where(con_votos, votos_segundo, 0.0),
+        'total': votos.sum(axis=1),
+        'margen': np.where(con_votos, votos_ganador - votos_segundo, 0.0),
+    }
+
+def disolver_grupo(geometrias):
+    """Une las secciones de un grupo en un polígono cerrando los huecos entre ellas.
+    
+    Es una función de módulo para poder ejecutarse en un pool de procesos.
+    """
+    # Validar y reparar geometrías antes de procesar
+    if not geometrias.is_valid.all():
+        geometrias = geometrias.buffer(0)
+    
+    try:
+        # Buffer positivo pequeño para cerrar gaps
+        geoms_buffered = geometrias.buffer(0.0008)
+        
+        # Unary union: fusiona todo en un solo polígono
+        merged_geom = geoms_buffered.unary_union
+        
+        # Buffer negativo para regresar al tamaño original
+        merged_geom = merged_geom.buffer(-0.0006)
+        
+        # Simplificar contorno
+        merged_geom = merged_geom.simplify(0.002, preserve_topology=True)
+        
+        # Validar geometría final
+        if not merged_geom.is_valid:
+            merged_geom = merged_geom.buffer(0)
+    
+    except Exception as geom_error:
+        print(f"    ⚠️ Error procesando geometría: {geom_error}")
+        merged_geom = geometrias.unary_union
+        if not merged_geom.is_valid:
+            merged_geom = merged_geom.buffer(0)
+    
+    return merged_geom
+
+
+def quitar_huecos(geom, area_min):
+    """Elimina anillos interiores más chicos que area_min (astillas entre secciones)"""
+    poligonos = [p for p in shapely.get_parts(geom) if p.geom_type == 'Polygon']
+    if not poligonos:
+        return geom
+    
+    limpios = [
+        Polygon(p.exterior, [r for r in p.interiors if Polygon(r).area >= area_min])
+        for p in poligonos
+    ]
+    return limpios[0] if len(limpios) == 1 else MultiPolygon(limpios)
+
+
+def disolver_cobertura(geometrias, precision=1e-6, area_min_hueco=1e-6):
+    """Une secciones que cubren el territorio sin huecos ni traslapes (unión de cobertura).
+    
+    Ajusta los vértices a una malla de `precision` grados para que los bordes
+    compartidos coincidan y aplica coverage_union_all, que solo recorre aristas.
+    Si el resultado no conserva el área (la entrada no era una cobertura), usa
+    union_all sobre la misma malla. Sin buffers: los bordes no se deforman.
+    No simplifica: eso se hace después para todo el nivel con simplificar_cobertura,
+    así los bordes que comparten dos unidades se simplifican una sola vez.
+    """
+    geoms = shapely.set_precision(np.asarray(geometrias), precision)
+    geoms = geoms[~shapely.is_empty(geoms)]
+    
+    area_esperada = shapely.area(geoms).sum()
+    try:
+        merged_geom = shapely.coverage_union_all(geoms)
+        if not merged_geom.is_valid or abs(merged_geom.area - area_esperada) > 1e-9 * max(area_esperada, 1):
+            raise ValueError("la entrada no es una cobertura")
+    except Exception:
+        merged_geom = shapely.union_all(geoms, grid_size=precision)
+    
+    return quitar_huecos(merged_geom, area_min_hueco)
+
+
+# Tolerancia de coverage_simplify (Visvalingam: ~raíz del área de los triángulos
+# que se quitan). 0.0045 deja menos vértices que el buffer + simplify(0.002)
+# anterior y menos diferencia con la unión exacta (ver `benchmarks.py cobertura`)
+TOLERANCIA_LIMITES = 0.0045
+
+
+def simplificar_cobertura(geometrias, tolerancia):
+    """Simplifica las unidades de un nivel sin abrir astillas ni traslapes entre ellas.
+    
+    Si las geometrías forman una cobertura válida, coverage_simplify simplifica cada
+    arista compartida una sola vez y las dos unidades vecinas reciben el mismo borde.
+    Si no (o con un GEOS anterior a 3.12) se simplifica cada polígono por separado
+    con Douglas-Peucker a la mitad de la tolerancia, que da un detalle parecido.
+    """
+    geoms = np.asarray(geometrias, dtype=object)
+    validas = ~shapely.is_missing(geoms)
+    try:
+        if shapely.coverage_is_valid(geoms[validas]):
+            simplificadas = geoms.copy()
+            simplificadas[validas] = shapely.coverage_simplify(geoms[validas], tolerancia)
+            return simplificadas
+    except (AttributeError, shapely.errors.GEOSException, shapely.errors.UnsupportedGEOSVersionError):
+        pass
+    return shapely.simplify(geoms, tolerancia / 2, preserve_topology=True)
+
+# ============================================================================
+# PIRÁMIDE DE GEOMETRÍA
+# ============================================================================
+# (zoom máximo, tolerancia en grados): a menor zoom, polígonos más simplificados.
+# A zoom 7 un pixel mide ~0.01°, así que 0.005° no se nota en la vista del estado.
+PIRAMIDE_GEOMETRIA = [(8, 0.005), (10, 0.002)]
+
+# Vista nacional: rollups precompilados por estado y por distrito federal, con
+# fronteras simplificadas a la escala del país (zoom 4: un pixel ≈ 0.1°)
+NIVELES_NACIONALES = ['ESTADO', 'DISTRITO_FEDERAL']
+MENSAJE_NACIONAL = "Vista nacional sin precompilar: ejecuta `python Visualizacion.py construir`"
+TOLERANCIA_NACIONAL = {'ESTADO': 0.02, 'DISTRITO_FEDERAL': 0.01}  # de coverage_simplify
+
+
+def tolerancia_para_zoom(zoom):
+    """Tolerancia de simplificación para un zoom de mapbox (0 = resolución cargada)"""
+    for zoom_max, tolerancia in PIRAMIDE_GEOMETRIA:
+        if zoom < zoom_max:
+            return tolerancia
+    return 0.0
+
+# ============================================================================
+# GEOJSON COMPACTO
+# ============================================================================
+def geojson_compacto(geometrias, ids, decimales=5):
+    """
+    FeatureCollection mínima para plotly: solo id y geometría.
+    Redondea coordenadas a `decimales` (5 ≈ 1 m) y quita vértices repetidos tras
+    redondear. Las propiedades no se envían: la figura lee los valores del
+    DataFrame, no del GeoJSON.
+    """
+    geoms = shapely.transform(np.asarray(geometrias), lambda coords: np.round(coords, decimales))
+    try:
+        geoms = shapely.remove_repeated_points(geoms)
+    except shapely.errors.GEOSException:
+        # Algún anillo colapsa al redondear: se limpia polígono por polígono
+        geoms = np.array([_sin_repetidos(geom) for geom in geoms], dtype=object)
+
+    features = []
+    for id_, texto in zip(ids, shapely.to_geojson(geoms)):
+        features.append({
+            'type': 'Feature',
+            'id': str(id_),
+            'geometry': json.loads(texto) if texto is not None else None
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _sin_repetidos(geom):
+    """remove_repeated_points para una geometría; la deja igual si un anillo colapsa"""
+    try:
+        return shapely.remove_repeated_points(geom)
+    except shapely.errors.GEOSException:
+        return geom
+
+# ============================================================================
+# TESELAS VECTORIALES (MVT)
+# ============================================================================
+# Codificación mínima de Mapbox Vector Tiles (spec 2.1) sin dependencias extra:
+# una capa de polígonos con id por feature y sin propiedades.
+EXTENSION_TESELA = 4096
+MARGEN_TESELA = 64
+CLASES_TESELAS = 8  # Tramos de color de las métricas continuas en modo teselas
+ZOOM_MAX_TESELAS = 22  # Último zoom de la pirámide de teselas que se sirve
+
+
+def _varint(n):
+    datos = bytearray()
+    while n > 0x7F:
+        datos.append((n & 0x7F) | 0x80)
+        n >>= 7
+    datos.append(n)
+    return bytes(datos)
+
+
+def _campo_bytes(numero, datos):
+    """Campo protobuf de longitud variable (wire type 2)"""
+    return _varint(numero << 3 | 2) + _varint(len(datos)) + datos
+
+
+def _campo_varint(numero, valor):
+    """Campo protobuf entero (wire type 0)"""
+    return _varint(numero << 3) + _varint(valor)
+
+
+def _comandos_poligono(geom):
+    """Enteros de geometría MVT (MoveTo/LineTo/ClosePath con deltas zigzag) de un (Multi)Polygon"""
+    comandos = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for poligono in shapely.get_parts(geom):
+        # Anillo exterior con área positiva en coordenadas de la tesela (y hacia abajo)
+        poligono = shapely.geometry.polygon.orient(poligono, sign=1.0)
+        for anillo in [poligono.exterior, *poligono.interiors]:
+            puntos = np.asarray(anillo.coords, dtype=np.int64)[:-1]
+            if len(puntos) < 3:
+                continue
+            deltas = np.diff(np.vstack([cursor, puntos]), axis=0)
+            cursor = puntos[-1]
+            zigzag = ((deltas << 1) ^ (deltas >> 63)).ravel().tolist()
+            comandos += [1 | 1 << 3, *zigzag[:2], 2 | (len(puntos) - 1) << 3, *zigzag[2:], 7 | 1 << 3]
+    return comandos
+
+
+def codificar_mvt(nombre_capa, features, extension=EXTENSION_TESELA):
+    """Tesela MVT (bytes) con una capa; `features` son pares (id, comandos de geometría)"""
+    if not features:
+        return b''
+
+    capa = _campo_varint(15, 2) + _campo_bytes(1, nombre_capa.encode())
+    for id_, comandos in features:
+        geometria = b''.join(_varint(c) for c in comandos)
+        capa += _campo_bytes(2, _campo_varint(1, id_) + _campo_varint(3, 3) + _campo_bytes(4, geometria))
+    capa += _campo_varint(5, extension)
+    return _campo_bytes(3, capa)
+
+
+def limites_tesela(z, x, y, margen=0.0):
+    """(lon_min, lat_min, lon_max, lat_max) de la tesela z/x/y, con margen en fracción de tesela"""
+    n = 2 ** z
+
+    def lon(px):
+        return px / n * 360.0 - 180.0
+
+    def lat(py):
+        return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py / n))))
+
+    return lon(x - margen), lat(y + 1 + margen), lon(x + 1 + margen), lat(y - margen)
+
+
+def geometrias_a_tesela(geometrias, ids, z, x, y, extension=EXTENSION_TESELA, margen=MARGEN_TESELA):
+    """
+    Proyecta a Web Mercator en coordenadas enteras de la tesela, recorta con margen,
+    simplifica a medio pixel y devuelve [(id, comandos)] de los polígonos no vacíos.
+    """
+    n = 2 ** z
+
+    def a_tesela(coords):
+        lon, lat = coords[:, 0], np.clip(coords[:, 1], -85.0511, 85.0511)
+        px = (lon + 180.0) / 360.0 * n
+        py = (1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n
+        return np.column_stack([(px - x) * extension, (py - y) * extension])
+
+    geoms = shapely.transform(np.asarray(geometrias), a_tesela)
+    geoms = shapely.clip_by_rect(geoms, -margen, -margen, extension + margen, extension + margen)
+    geoms = shapely.simplify(geoms, extension / 512)
+    geoms = shapely.set_precision(geoms, 1.0)
+
+    features = []
+    for id_, geom in zip(ids, geoms):
+        if geom is None or geom.is_empty:
+            continue
+        poligonos = [p for p in shapely.get_parts(geom) if isinstance(p, Polygon)]
+        comandos = _comandos_poligono(MultiPolygon(poligonos)) if poligonos else []
+        if comandos:
+            features.append((int(id_), comandos))
+    return features
+
+# ============================================================================
+# ESCRITURA EN DISCO
+# ============================================================================
+def escribir_atomico(ruta, escribir):
+    """Escribe `ruta` con `escribir(ruta_temporal)` y la publica con un rename atómico.
+    
+    El temporal lleva pid e hilo: varios workers (o hilos) pueden escribir el
+    mismo archivo a la vez y los lectores solo ven una versión completa.
+    """
+    ruta = Path(ruta)
+    ruta_tmp = ruta.with_name(f'{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        escribir(ruta_tmp)
+        os.replace(ruta_tmp, ruta)
+    finally:
+        ruta_tmp.unlink(missing_ok=True)
+
+
+# ============================================================================
+# CACHE DE ESTADOS
+# ============================================================================
+def tamano_en_memoria(df):
+    """Bytes aproximados de un (Geo)DataFrame, incluyendo coordenadas de las geometrías"""
+    total = int(df.memory_usage(deep=True, index=True).sum())
+    if isinstance(df, gpd.GeoDataFrame) and df.geometry.name in df.columns:
+        # memory_usage solo cuenta punteros; cada coordenada son 2 float64
+        total += int(shapely.get_num_coordinates(np.asarray(df.geometry)).sum()) * 16
+    return total
+
+
+class CacheLRU:
+    """Cache LRU con presupuesto en bytes (tamaño medido de cada valor).
+    
+    Un acierto mueve la entrada al final; al insertar se descartan las menos
+    usadas recientemente hasta caber en el presupuesto. Siempre conserva al menos
+    la entrada recién insertada, aunque por sí sola lo supere.
+    """
+    
+    def __init__(self, max_bytes, al_descartar=None):
+        self.max_bytes = max_bytes
+        self.al_descartar = al_descartar
+        self._datos = OrderedDict()  # {clave: (valor, bytes)}
+        self._lock = threading.RLock()
+        self.bytes_usados = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.descartes = 0
+    
+    def __contains__(self, clave):
+        return clave in self._datos
+    
+    def __len__(self):
+        return len(self._datos)
+    
+    def obtener(self, clave):
+        """Devuelve el valor (y lo marca como usado) o None si no está"""
+        with self._lock:
+            if clave not in self._datos:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return self._datos[clave][0]
+    
+    def guardar(self, clave, valor, tamano=None):
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            tamano = tamano_en_memoria(valor) if tamano is None else tamano
+            self._datos[clave] = (valor, tamano)
+            self.bytes_usados += tamano
+            
+            while self.bytes_usados > self.max_bytes and len(self._datos) > 1:
+                antigua = next(iter(self._datos))
+                self._quitar(antigua)
+                self.descartes += 1
+                print(f"    🗑️ Eliminado {antigua} del cache (LRU)")
+                if self.al_descartar:
+                    self.al_descartar(antigua)
+    
+    def _quitar(self, clave):
+        _, tamano = self._datos.pop(clave)
+        self.bytes_usados -= tamano
+    
+    def limpiar(self):
+        """Vacía el cache (los contadores se conservan)"""
+        with self._lock:
+            claves = list(self._datos)
+            self._datos.clear()
+            self.bytes_usados = 0
+        if self.al_descartar:
+            for clave in claves:
+                self.al_descartar(clave)
+    
+    def info(self):
+        """Estado del cache: entradas (de menos a más reciente), tamaños y contadores"""
+        with self._lock:
+            return {
+                'entradas': {clave: round(tamano / 2**20, 2) for clave, (_, tamano) in self._datos.items()},
+                'usado_mb': round(self.bytes_usados / 2**20, 2),
+                'max_mb': round(self.max_bytes / 2**20, 2),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'descartes': self.descartes,
+            }
+
+# ============================================================================
+# CACHE DE FIGURAS
+# ============================================================================
+class CacheFiguras:
+    """Salidas ya serializadas de los callbacks (figuras, paneles), por clave y versión de datos.
+    
+    Primer nivel en memoria (CacheLRU por bytes del JSON) y, opcionalmente, un
+    segundo nivel en disco compartido por todos los workers: `directorio/<versión>/`.
+    Al cambiar la versión de los datos las entradas viejas dejan de coincidir y
+    la carpeta de la versión anterior se borra en la siguiente escritura.
+    """
+    
+    def __init__(self, max_bytes, directorio=None):
+        self.memoria = CacheLRU(max_bytes)
+        self.directorio = Path(directorio) if directorio else None
+        self._version_disco = None
+    
+    def _ruta(self, clave, version):
+        nombre = hashlib.sha1(repr(clave).encode()).hexdigest()
+        return self.directorio / str(version) / f'{nombre}.json'
+    
+    def obtener(self, clave, version):
+        """Valor deserializado (dicts/listas JSON) o None si no está en ningún nivel"""
+        texto = self.memoria.obtener((version, clave))
+        if texto is None and self.directorio is not None:
+            ruta = self._ruta(clave, version)
+            try:
+                texto = ruta.read_text(encoding='utf-8')
+            except OSError:
+                return None
+            self.memoria.guardar((version, clave), texto, tamano=len(texto))
+        return None if texto is None else json.loads(texto)
+    
+    def guardar(self, clave, version, valor):
+        """Serializa `valor` (figura, componentes Dash o JSON) y lo devuelve deserializado"""
+        texto = to_json_plotly(valor)
+        self.memoria.guardar((version, clave), texto, tamano=len(texto))
+        if self.directorio is not None:
+            try:
+                self._escribir_disco(clave, version, texto)
+            except OSError as e:
+                print(f"    ⚠️ No se pudo guardar la figura en disco: {e}")
+        return json.loads(texto)
+    
+    def _escribir_disco(self, clave, version, texto):
+        ruta = self._ruta(clave, version)
+        if self._version_disco != version:
+            # Figuras de versiones anteriores de los datos ya no se van a pedir
+            if self.directorio.exists():
+                for vieja in self.directorio.iterdir():
+                    if vieja.is_dir() and vieja.name != str(version):
+                        shutil.rmtree(vieja, ignore_errors=True)
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._version_disco = version
+        escribir_atomico(ruta, lambda tmp: tmp.write_text(texto, encoding='utf-8'))
+    
+    def memorizar(self, clave, version, funcion):
+        """Valor cacheado de `clave` o, si no está, el resultado de `funcion()` ya guardado"""
+        valor = self.obtener(clave, version)
+        if valor is None:
+            valor = self.guardar(clave, version, funcion())
+        return valor
+    
+    def limpiar(self):
+        self.memoria.limpiar()
+        if self.directorio is not None:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            self._version_disco = None
+
+
 # ============================================================================
 # CLASE PRINCIPAL
 # ============================================================================
 class VisualizadorElectoral:
-    def __init__(self, csv_path, shp_path):
+    # Subir cuando cambie el pipeline de _construir_estado para invalidar artefactos
+    VERSION_ARTEFACTOS = 2
+    # Subir cuando cambie la disolución de niveles agregados para invalidar límites
+    VERSION_LIMITES = 3
+    # Subir cuando cambie cómo se arman las figuras para invalidar el caché de figuras
+    VERSION_FIGURAS = 2
+    
+    def __init__(self, csv_path, shp_path, parquet_dir=None, cache_max_mb=1024, workers_disolucion=1,
+                 decimales_geojson=5, teselas_desde=None, cache_figuras_mb=256, dir_figuras=None):
         """Inicializa el visualizador en modo lazy loading (optimizado)"""
         print("🔄 Inicializando visualizador (modo optimizado)...")
         
@@ -257,24 +753,230 @@ class VisualizadorElectoral:
         self.csv_path = csv_path
         self.shp_path = shp_path
         
-        # Cache de estados
-        self.cache_estados = {}  # {estado_id: GeoDataFrame merged}
-        self.max_cache = 3  # Máximo de estados en memoria simultáneos
+        # Almacén columnar particionado por ID_ENTIDAD (opcional, se genera con `particionar`)
+        if parquet_dir is None:
+            parquet_dir = Path(csv_path).parent / 'maestro_por_estado'
+        self.parquet_dir = Path(parquet_dir)
+        self._columnas_disponibles = None
+        
+        # Cache de estados: LRU con presupuesto de memoria (no por número de estados)
+        self.cache_estados = CacheLRU(cache_max_mb * 2**20, al_descartar=self._al_descartar_estado)
+        self.cache_niveles = {}  # {(estado_id, nivel): GeoDataFrame agregado}
+        self.cache_atributos = {}  # {(estado_id, nivel): DataFrame agregado sin geometría}
+        self.cache_rankings = {}  # {(estado_id, nivel, year): DataFrame ranking por partido}
+        self.cache_piramide = {}  # {(estado_id, nivel, tolerancia): GeoSeries simplificada}
+        self.cache_geojson = {}  # {(estado_id, nivel, tolerancia): (GeoJSON solo geometría, versión)}
+        
+        # Procesos para disolver polígonos de niveles agregados (1 = secuencial)
+        self.workers_disolucion = max(1, int(workers_disolucion))
+        
+        # Decimales de las coordenadas enviadas al navegador (5 ≈ 1 m)
+        self.decimales_geojson = int(decimales_geojson)
+        # Ruta donde la app sirve los GeoJSON cacheados (None = incrustarlos en la figura)
+        self.url_geojson = None
+        
+        # Teselas vectoriales: mapas de secciones con al menos `teselas_desde` secciones
+        # se dibujan con capas MVT servidas en `url_teselas` (None = nunca)
+        self.teselas_desde = teselas_desde
+        self.url_teselas = None
+        self.cache_teselas = CacheLRU(64 * 2**20)  # {(estado_id, nivel, z, x, y): [(id, comandos)]}
+        self.cache_cajas = {}  # {(estado_id, nivel): (geometrías, ids, cajas envolventes)}
+        self.cache_clases = CacheLRU(32 * 2**20)  # {(estado_id, nivel, metrica, ganador): clases de color del mapa}
+        self.cache_nacional = {}  # {nivel: GeoDataFrame nacional (ESTADO o DISTRITO_FEDERAL)}
+        
+        # Los callbacks corren en hilos paralelos: un candado por estado/nivel evita
+        # que dos hilos carguen o disuelvan lo mismo a la vez (el segundo usa el cache)
+        self._candados = {}
+        self._lock_candados = threading.Lock()
+        # Un solo candado para los caches derivados (niveles, atributos, rankings, pirámide,
+        # GeoJSON y cajas): los hilos leen/insertan y el descarte de un estado borra a la vez
+        self._lock_derivados = threading.Lock()
+        
+        # Salidas de los callbacks ya serializadas, por entradas y versión de los datos
+        self.cache_figuras = CacheFiguras(cache_figuras_mb * 2**20, dir_figuras)
         
         print(f"✅ Visualizador listo (carga bajo demanda)")
         print(f"   📂 CSV: {self.csv_path}")
-        print(f"   📂 SHP: {self.shp_path}\n")
+        print(f"   📂 SHP: {self.shp_path}")
+        if self.usa_parquet():
+            print(f"   📦 Parquet por estado: {self.parquet_dir}")
+        elif any(self.parquet_dir.glob('estado_*.parquet')):
+            print(f"   ⚠️ El almacén Parquet no corresponde al CSV actual (usa `particionar`); se lee el CSV")
+        print()
+
+    def _ruta_parquet(self, estado_id):
+        """Ruta del archivo Parquet con los registros de un estado"""
+        return self.parquet_dir / f'estado_{int(estado_id):02d}.parquet'
+
+    def usa_parquet(self):
+        """Indica si existe el almacén particionado y está al día con el CSV (se elige automáticamente)"""
+        return (self.parquet_dir.is_dir() and any(self.parquet_dir.glob('estado_*.parquet'))
+                and self._particiones_vigentes('estado'))
+
+    def _particiones_vigentes(self, tipo):
+        """True si las particiones `tipo` ('estado' o 'secciones') se generaron con las fuentes actuales.
+        
+        Sin fuentes presentes (deploy solo con el almacén) se usan tal cual.
+        """
+        firma = self._firma_fuentes()
+        if firma is None:
+            return True
+        try:
+            with open(self.parquet_dir / 'particiones.json', encoding='utf-8') as f:
+                return json.load(f).get(tipo) == firma
+        except (OSError, ValueError):
+            return False
+
+    def _sellar_particiones(self, tipo):
+        """Registra en particiones.json la firma de las fuentes con que se generó `tipo`"""
+        manifiesto = self.parquet_dir / 'particiones.json'
+        try:
+            with open(manifiesto, encoding='utf-8') as f:
+                sello = json.load(f)
+        except (OSError, ValueError):
+            sello = {}
+        sello[tipo] = self._firma_fuentes()
+        escribir_atomico(manifiesto, lambda tmp: tmp.write_text(json.dumps(sello, indent=2), encoding='utf-8'))
+
+    def get_available_columns(self):
+        """Columnas del maestro electoral, leyendo solo el esquema/encabezado"""
+        if self._columnas_disponibles is None:
+            columnas = None
+            if self.usa_parquet():
+                try:
+                    import pyarrow.parquet as pq
+                    primer_archivo = next(self.parquet_dir.glob('estado_*.parquet'))
+                    columnas = pq.read_schema(primer_archivo).names
+                except Exception as e:
+                    print(f"    ⚠️ Error leyendo esquema Parquet: {e}")
+            if columnas is None:
+                columnas = pd.read_csv(self.csv_path, nrows=0).columns.tolist()
+            self._columnas_disponibles = columnas
+        return self._columnas_disponibles
+
+    def particionar_csv(self):
+        """Convierte el CSV maestro en un archivo Parquet por estado (paso offline).
+        
+        El CSV sigue siendo la fuente; este almacén solo acelera la carga por estado,
+        ya que permite leer las filas de un estado y únicamente las columnas pedidas.
+        Las columnas se guardan ya convertidas a número, así que la carga no limpia nada.
+        """
+        print(f"📦 Particionando {self.csv_path} por ID_ENTIDAD...")
+        df = self._process_csv_columns(self._leer_csv())
+        self.parquet_dir.mkdir(parents=True, exist_ok=True)
+        
+        for estado_id, df_estado in df.groupby('ID_ENTIDAD', sort=True):
+            ruta = self._ruta_parquet(estado_id)
+            # Escritura atómica: los workers nunca ven un archivo a medio escribir
+            escribir_atomico(ruta, lambda tmp: df_estado.to_parquet(tmp, index=False))
+            print(f"   ✓ {ESTADOS.get(estado_id, estado_id)}: {len(df_estado):,} registros")
+        
+        self._sellar_particiones('estado')
+        self._columnas_disponibles = None
+        print(f"✅ Almacén listo en {self.parquet_dir}")
+
+    def _candado(self, clave):
+        """Candado (reentrante) propio de `clave`, creado la primera vez que se pide"""
+        with self._lock_candados:
+            if clave not in self._candados:
+                self._candados[clave] = threading.RLock()
+            return self._candados[clave]
+
+    def _derivado(self, cache, clave):
+        """Valor de un cache derivado (None si no está)"""
+        with self._lock_derivados:
+            return cache.get(clave)
+
+    def _guardar_derivado(self, cache, clave, valor):
+        """Guarda en un cache derivado; si otro hilo se adelantó, devuelve el suyo"""
+        with self._lock_derivados:
+            return cache.setdefault(clave, valor)
+
+    def _caches_derivados(self):
+        return (self.cache_niveles, self.cache_atributos, self.cache_rankings,
+                self.cache_piramide, self.cache_geojson, self.cache_cajas)
 
     def load_state(self, estado_id):
         """Carga datos de un estado específico bajo demanda"""
-        
+        with self._candado(('estado', estado_id)):
+            return self._cargar_estado(estado_id)
+
+    def _cargar_estado(self, estado_id):
         # Verificar cache
-        if estado_id in self.cache_estados:
+        merged = self.cache_estados.obtener(estado_id)
+        if merged is not None:
             print(f"  💾 Usando cache para estado {estado_id} ({ESTADOS.get(estado_id, 'N/A')})")
-            return self.cache_estados[estado_id]
+            return merged
         
         print(f"  📥 Cargando estado {estado_id} ({ESTADOS.get(estado_id, 'N/A')})...")
         
+        # Artefacto precompilado con `construir` (ya proyectado, simplificado y unido)
+        merged = self._leer_artefacto(estado_id)
+        if merged is None:
+            merged = self._construir_estado(estado_id)
+            # Segundo nivel de cache: el próximo worker (p. ej. reciclado por
+            # --max-requests) lee el artefacto en lugar de volver al CSV y al SHP
+            self._guardar_artefacto(estado_id, merged)
+        
+        # Guardar en cache (descarta los estados menos usados si no cabe)
+        self.cache_estados.guardar(estado_id, merged)
+        info = self.cache_estados.info()
+        print(f"    💾 Cache: {info['usado_mb']:.0f}/{info['max_mb']:.0f} MB en {len(self.cache_estados)} estados")
+        
+        return merged
+
+    def precargar(self, estados):
+        """
+        Carga estados (y el GeoJSON de su vista inicial) por adelantado.
+        Con `gunicorn --preload` se ejecuta en el proceso maestro antes del fork:
+        los workers heredan el cache por copy-on-write en lugar de cargar cada uno su copia.
+        """
+        print(f"📥 Precargando {len(estados)} estados...")
+        for estado_id in estados:
+            self.load_state(estado_id)
+            self.geojson_nivel('SECCION', estado_id, tolerancia_para_zoom(7))
+        if self._nacional_vigente():
+            for nivel in NIVELES_NACIONALES:
+                self.cargar_nacional(nivel)
+        print(f"✅ Precarga lista: {self.cache_estados.info()['usado_mb']} MB")
+
+    def _al_descartar_estado(self, estado_id):
+        """Libera lo derivado de un estado que salió del cache (borrando en su lugar:
+        otros hilos pueden estar insertando lo de otros estados)"""
+        with self._lock_derivados:
+            for cache in self._caches_derivados():
+                for clave in [k for k in cache if k[0] == estado_id]:
+                    del cache[clave]
+
+    def info_cache(self):
+        """Contenido, memoria usada y contadores (aciertos/fallos/descartes) del cache"""
+        return self.cache_estados.info()
+
+    def limpiar_cache(self):
+        """Vacía el cache de estados y todo lo derivado de ellos"""
+        self.cache_estados.limpiar()
+        with self._lock_derivados:
+            for cache in self._caches_derivados():
+                cache.clear()
+        self.cache_teselas.limpiar()
+        self.cache_clases.limpiar()
+        self.cache_nacional = {}
+        self.cache_figuras.limpiar()
+
+    def version_datos(self):
+        """Versión de lo que se muestra, clave del caché de figuras: firma de las fuentes
+        (o, en un deploy solo con artefactos, de sus sellos) más las versiones del pipeline
+        y los ajustes que cambian las figuras. El caché en disco sobrevive a los deploys."""
+        firma = self._firma_fuentes()
+        if firma is None:
+            sellos = sorted(self.parquet_dir.glob('*.json'))
+            firma = '|'.join(f'{p.name}:{p.stat().st_size}:{p.stat().st_mtime_ns}' for p in sellos)
+        partes = [firma, f'f{self.VERSION_FIGURAS}', f'l{self.VERSION_LIMITES}',
+                  f't{self.teselas_desde}', f'd{self.decimales_geojson}']
+        return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:16]
+
+    def _construir_estado(self, estado_id):
+        """Pipeline completo de un estado: lectura, limpieza, geometría, merge y coaliciones"""
         # Columnas mínimas necesarias para visualización
         columnas_base = [
             'ID_ENTIDAD', 'SECCION', 'LISTA_NOMINAL_2024', 'TOTAL_VOTOS_2024',
@@ -300,30 +1002,30 @@ class VisualizadorElectoral:
             'VOLATILIDAD_HISTORICA_', 'TENDENCIA_HISTORICA_'
         ]
         
-        # Leer CSV solo con columnas necesarias
+        # Leer solo columnas necesarias
         try:
-            # Primero leer para ver qué columnas existen
-            df_temp = pd.read_csv(self.csv_path, nrows=0)
-            columnas_disponibles = df_temp.columns.tolist()
+            # Primero ver qué columnas existen (esquema Parquet o encabezado del CSV)
+            columnas_disponibles = self.get_available_columns()
             
-            # Filtrar solo las que existen
-            columnas_a_leer = [c for c in columnas_base if c in columnas_disponibles]
+            # Filtrar solo las que existen (sin repetidas: read_parquet no las descarta)
+            columnas_a_leer = [c for c in dict.fromkeys(columnas_base) if c in columnas_disponibles]
             
             # Agregar columnas opcionales que existan
             for patron in columnas_opcionales:
                 columnas_a_leer.extend([c for c in columnas_disponibles if patron in c and c not in columnas_a_leer])
             
-            # Leer CSV filtrado
-            df = pd.read_csv(
-                self.csv_path,
-                usecols=columnas_a_leer,
-                dtype={'ID_ENTIDAD': 'int16', 'SECCION': 'int32'},
-                low_memory=False
-            )
-            
-            # Filtrar solo el estado
-            df = df[df['ID_ENTIDAD'] == estado_id].copy()
-            print(f"    ✓ CSV: {len(df):,} registros del estado")
+            ruta_parquet = self._ruta_parquet(estado_id)
+            if ruta_parquet.exists() and self._particiones_vigentes('estado'):
+                # Almacén particionado: solo las filas y columnas de este estado
+                df = pd.read_parquet(ruta_parquet, columns=columnas_a_leer)
+                print(f"    ✓ Parquet: {len(df):,} registros del estado")
+            else:
+                # Leer CSV filtrado (tipos, miles y '-' resueltos por el parser)
+                df = self._leer_csv(columnas_a_leer)
+                
+                # Filtrar solo el estado
+                df = df[df['ID_ENTIDAD'] == estado_id].copy()
+                print(f"    ✓ CSV: {len(df):,} registros del estado")
             
         except Exception as e:
             print(f"    ⚠️ Error leyendo CSV: {e}")
@@ -333,18 +1035,8 @@ class VisualizadorElectoral:
         # Procesar CSV (conversiones numéricas)
         df = self._process_csv_columns(df)
         
-        # Leer Shapefile filtrado
-        gdf = gpd.read_file(self.shp_path)
-        
-        # Filtrar shapefile por estado
-        if 'ENTIDAD' in gdf.columns:
-            gdf['ID_ENTIDAD'] = pd.to_numeric(gdf['ENTIDAD'], errors='coerce').astype('Int64')
-        
-        gdf = gdf[gdf['ID_ENTIDAD'] == estado_id].copy()
-        print(f"    ✓ SHP: {len(gdf):,} geometrías del estado")
-        
-        # Procesar shapefile
-        gdf = self._process_shapefile(gdf)
+        # Leer y procesar solo las geometrías del estado
+        gdf = self._secciones_estado(estado_id)
         
         # Merge
         columnas_merge = ['SECCION', 'ID_ENTIDAD']
@@ -356,39 +1048,365 @@ class VisualizadorElectoral:
         
         print(f"    ✓ Merge: {len(merged):,} registros")
         
-        # Gestión de cache: eliminar estado más antiguo si superamos el límite
-        if len(self.cache_estados) >= self.max_cache:
-            oldest_state = next(iter(self.cache_estados))
-            del self.cache_estados[oldest_state]
-            print(f"    🗑️ Eliminado estado {oldest_state} del cache")
+        return merged
+
+    def _ruta_artefacto(self, estado_id):
+        """Ruta del GeoParquet listo para servir (merge + coaliciones) de un estado"""
+        return self.parquet_dir / f'listo_{int(estado_id):02d}.parquet'
+
+    def _firma_fuentes(self):
+        """Sello de versión: versión del pipeline + tamaño/fecha de los archivos fuente.
+        
+        Si ninguna fuente está presente (deploy solo con artefactos) devuelve None.
+        """
+        partes = []
+        base_shp = os.path.splitext(self.shp_path)[0]
+        for ruta in [self.csv_path, self.shp_path, base_shp + '.dbf']:
+            if os.path.exists(ruta):
+                info = os.stat(ruta)
+                partes.append(f'{os.path.basename(ruta)}:{info.st_size}:{int(info.st_mtime)}')
+        
+        if not partes:
+            return None
         
-        # Guardar en cache
-        self.cache_estados[estado_id] = merged
+        partes.insert(0, f'v{self.VERSION_ARTEFACTOS}')
+        return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:16]
+
+    def _leer_artefacto(self, estado_id):
+        """Carga el artefacto de un estado si existe y su sello coincide con las fuentes"""
+        ruta = self._ruta_artefacto(estado_id)
+        if not ruta.exists():
+            return None
         
-        return merged
+        try:
+            sello = self._leer_sello(ruta)
+            firma = self._firma_fuentes()
+            if not sello or (firma and sello.get('firma') != firma):
+                print(f"    ⚠️ Artefactos desactualizados, reconstruyendo desde las fuentes")
+                return None
+            
+            merged = gpd.read_parquet(ruta)
+            print(f"    ✓ Artefacto: {len(merged):,} registros ({ruta.name})")
+            return merged
+        except Exception as e:
+            print(f"    ⚠️ Error leyendo {ruta.name}: {e}")
+            return None
 
-    def _process_csv_columns(self, df):
-        """Procesa columnas numéricas del CSV"""
-        numeric_cols = [c for c in df.columns if c not in ['ID_ENTIDAD', 'SECCION']]
-        numeric_cols = [c for c in numeric_cols if not c.startswith('TIPO_')]
-        numeric_cols = [c for c in numeric_cols if not c.startswith('TENDENCIA_')]
-        numeric_cols = [c for c in numeric_cols if c not in ['GANADOR_2024', 'SEGUNDO_2024', 'TIPO_SECCION']]
-        
-        for col in numeric_cols:
-            if 'PARTICIPACION' in col or 'ABSTENCION' in col:
-                df[col] = pd.to_numeric(
-                    df[col].astype(str).str.replace('%', '').str.replace(',', '').replace('-', '0'), 
-                    errors='coerce'
-                ).clip(0, 100)
+    def _escribir_artefacto(self, estado_id, merged):
+        """Escribe listo_XX.parquet de forma atómica (sin sellarlo)"""
+        self.parquet_dir.mkdir(parents=True, exist_ok=True)
+        ruta = self._ruta_artefacto(estado_id)
+        escribir_atomico(ruta, lambda tmp: merged.to_parquet(tmp, index=False))
+        return ruta
+
+    def _guardar_artefacto(self, estado_id, merged):
+        """Guarda y sella el artefacto de un estado procesado en línea.
+        
+        Un fallo (disco de solo lectura, sin espacio) no interrumpe la carga.
+        """
+        firma = self._firma_fuentes()
+        if firma is None:
+            return
+        try:
+            ruta = self._escribir_artefacto(estado_id, merged)
+            self._escribir_sello(ruta, firma)
+            print(f"    💾 Artefacto guardado en disco ({ruta.name})")
+        except Exception as e:
+            print(f"    ⚠️ No se pudo guardar el artefacto del estado {estado_id}: {e}")
+
+    def construir_artefactos(self, estados=None):
+        """Precompila cada estado (paso offline) y lo guarda listo para servir.
+        
+        Ejecuta una sola vez la reproyección, simplificación, conversiones, merge y
+        cálculo de coaliciones; load_state solo tiene que leer el resultado.
+        """
+        estados = estados or self.get_available_states()
+        firma = self._firma_fuentes()
+        print(f"🏗️ Construyendo artefactos para {len(estados)} estados (firma {firma})...")
+        self.parquet_dir.mkdir(parents=True, exist_ok=True)
+        
+        for estado_id in estados:
+            estado_id = int(estado_id)
+            merged = self._construir_estado(estado_id)
+            ruta = self._escribir_artefacto(estado_id, merged)
+            print(f"   ✓ {ESTADOS.get(estado_id, estado_id)}: {ruta.name}")
+            
+            # Límites disueltos de cada nivel agregado (solo dependen del shapefile)
+            # y el nivel ya unido con sus sumas, como lo pide agregar_por_nivel
+            # (a partir de `merged`: el artefacto aún no está sellado y load_state lo rehría)
+            secciones = self._secciones_estado(estado_id, simplificar=False)
+            for nivel in ['MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']:
+                if nivel in merged.columns:
+                    self._limites_nivel(merged, nivel, estado_id, [nivel], secciones=secciones,
+                                        workers=self.workers_disolucion)
+                    nivel_unido = self._unir_limites(merged, self._agregar_atributos(merged, nivel), nivel, estado_id)
+                    self._guardar_nivel(nivel_unido, nivel, estado_id)
+        
+        # Los sellos se escriben al final: un artefacto sin sello no se considera válido
+        for estado_id in estados:
+            self._escribir_sello(self._ruta_artefacto(estado_id), firma)
+        
+        # La vista nacional agrega todos los estados: se rehace con los artefactos nuevos
+        self.construir_nacional()
+        
+        print(f"✅ Artefactos listos en {self.parquet_dir}")
+
+    @staticmethod
+    def _ruta_sello(ruta):
+        """Sello de un artefacto: mismo nombre con .json (listo_XX.json, nacional.json)"""
+        return ruta.with_suffix('.json')
+
+    def _leer_sello(self, ruta):
+        """Sello del artefacto `ruta` ({} si no existe, está dañado o es de otra versión del pipeline).
+        
+        Cada artefacto tiene su propio sello y solo se reemplaza completo: varios
+        workers pueden sellar estados distintos a la vez sin pisarse.
+        """
+        try:
+            with open(self._ruta_sello(ruta), encoding='utf-8') as f:
+                sello = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return sello if sello.get('version') == self.VERSION_ARTEFACTOS else {}
+
+    def _escribir_sello(self, ruta, firma):
+        sello = json.dumps({'version': self.VERSION_ARTEFACTOS, 'firma': firma}, indent=2)
+        escribir_atomico(self._ruta_sello(ruta), lambda tmp: tmp.write_text(sello, encoding='utf-8'))
+
+    # ------------------------------------------------------------------
+    # Vista nacional
+    # ------------------------------------------------------------------
+    @staticmethod
+    def nivel_nacional(nivel):
+        """Nivel que se usa sin estado: secciones, municipios y distritos locales se ven por estado"""
+        return nivel if nivel in NIVELES_NACIONALES else 'ESTADO'
+
+    def _ruta_nacional(self, nivel):
+        return self.parquet_dir / f'nacional_{nivel}.parquet'
+
+    def _ruta_sello_nacional(self):
+        """Un solo sello para los dos rollups (nacional.json)"""
+        return self.parquet_dir / 'nacional.parquet'
+
+    def construir_nacional(self):
+        """Rollups nacionales por estado y por distrito federal, con fronteras simplificadas.
+        
+        Cada estado se lee directo de su artefacto (o de las fuentes) sin pasar por
+        cache_estados; la vista nacional solo necesita los archivos resultantes.
+        """
+        print("🇲🇽 Construyendo vista nacional...")
+        self.parquet_dir.mkdir(parents=True, exist_ok=True)
+        partes = {nivel: [] for nivel in NIVELES_NACIONALES}
+        
+        for estado_id in self.get_available_states():
+            estado_id = int(estado_id)
+            df = self._leer_artefacto(estado_id)
+            if df is None:
+                df = self._construir_estado(estado_id)
+            
+            distritos = self._unir_limites(
+                df, self._agregar_atributos(df, 'DISTRITO_FEDERAL'), 'DISTRITO_FEDERAL', estado_id
+            )
+            # Frontera del estado = unión de sus distritos (ya disueltos, sin huecos)
+            frontera = disolver_cobertura(distritos.geometry.dropna())
+            estado = self._agregar_atributos(df.assign(ESTADO=ESTADOS.get(estado_id, str(estado_id))), 'ESTADO')
+            estado = gpd.GeoDataFrame(estado, geometry=[frontera], crs=distritos.crs)
+            
+            for nivel, gdf in [('ESTADO', estado), ('DISTRITO_FEDERAL', distritos)]:
+                gdf.insert(0, 'ID_ENTIDAD', estado_id)
+                partes[nivel].append(gdf)
+            print(f"   ✓ {ESTADOS.get(estado_id, estado_id)}: {len(distritos)} distritos")
+        
+        for nivel, gdfs in partes.items():
+            gdf = pd.concat(gdfs, ignore_index=True)
+            # Todo el país a la vez: las fronteras entre estados también se simplifican una sola vez
+            gdf['geometry'] = simplificar_cobertura(gdf.geometry, TOLERANCIA_NACIONAL[nivel])
+            escribir_atomico(self._ruta_nacional(nivel), lambda tmp: gdf.to_parquet(tmp, index=False))
+        
+        self._escribir_sello(self._ruta_sello_nacional(), self._firma_fuentes())
+        self.cache_nacional = {}
+        print(f"✅ Vista nacional lista ({', '.join(NIVELES_NACIONALES)})")
+
+    def _nacional_vigente(self):
+        """True si los rollups nacionales existen y corresponden a las fuentes actuales"""
+        if not all(self._ruta_nacional(nivel).exists() for nivel in NIVELES_NACIONALES):
+            return False
+        firma = self._firma_fuentes()
+        sello = self._leer_sello(self._ruta_sello_nacional())
+        return bool(sello) and (firma is None or sello.get('firma') == firma)
+
+    def nacional_disponible(self):
+        """True si la vista nacional se puede servir (ya cargada o precompilada y al día)"""
+        return bool(self.cache_nacional) or self._nacional_vigente()
+
+    def cargar_nacional(self, nivel):
+        """Rollup nacional del nivel (atributos + fronteras simplificadas).
+        
+        No se construye aquí: leer todos los estados no cabe en una petición web.
+        Si falta o está desactualizada hay que ejecutar `construir`.
+        """
+        nivel = self.nivel_nacional(nivel)
+        if nivel in self.cache_nacional:
+            return self.cache_nacional[nivel]
+        with self._candado(('nacional',)):
+            if nivel in self.cache_nacional:
+                return self.cache_nacional[nivel]
+            if not self._nacional_vigente():
+                raise FileNotFoundError(MENSAJE_NACIONAL)
+            gdf = gpd.read_parquet(self._ruta_nacional(nivel))
+            print(f"  🇲🇽 Vista nacional por {nivel}: {len(gdf)} unidades")
+            self.cache_nacional[nivel] = gdf
+            return gdf
+
+    def _secciones_estado(self, estado_id, simplificar=True):
+        """Secciones del estado en EPSG:4326 con llaves numéricas (simplificadas o exactas)"""
+        gdf = self._leer_geometria_estado(estado_id)
+        
+        # Filtrar shapefile por estado
+        if 'ENTIDAD' in gdf.columns:
+            gdf['ID_ENTIDAD'] = pd.to_numeric(gdf['ENTIDAD'], errors='coerce').astype('Int64')
+        
+        gdf = gdf[gdf['ID_ENTIDAD'] == estado_id].copy()
+        print(f"    ✓ SHP: {len(gdf):,} geometrías del estado")
+        
+        # Procesar shapefile
+        return self._process_shapefile(gdf, simplificar=simplificar)
+
+    def _ruta_geometria(self, estado_id):
+        """Ruta del GeoParquet con las secciones (sin procesar) de un estado"""
+        return self.parquet_dir / f'secciones_{int(estado_id):02d}.parquet'
+
+    def _leer_geometria_estado(self, estado_id):
+        """Lee únicamente las secciones de un estado.
+        
+        Usa la partición GeoParquet del estado si existe; si no, aplica un filtro
+        de atributos sobre ENTIDAD en la lectura del shapefile para que OGR
+        descarte las secciones de otros estados antes de decodificar polígonos.
+        """
+        ruta = self._ruta_geometria(estado_id)
+        if ruta.exists() and self._particiones_vigentes('secciones'):
+            try:
+                return gpd.read_parquet(ruta)
+            except Exception as e:
+                print(f"    ⚠️ Error leyendo {ruta.name}: {e}")
+        
+        try:
+            import fiona
+            with fiona.open(self.shp_path) as src:
+                tipo_entidad = src.schema['properties'].get('ENTIDAD', '')
+            
+            if tipo_entidad.startswith('str'):
+                filtro = f"CAST(ENTIDAD AS INTEGER) = {int(estado_id)}"
             else:
-                df[col] = pd.to_numeric(
-                    df[col].astype(str).str.replace('%', '').str.replace(',', '').replace('-', '0'), 
-                    errors='coerce'
-                )
+                filtro = f"ENTIDAD = {int(estado_id)}"
+            
+            return gpd.read_file(self.shp_path, where=filtro)
+        except Exception as e:
+            print(f"    ⚠️ Error filtrando shapefile por estado: {e}")
+            return gpd.read_file(self.shp_path)
+
+    def particionar_shapefile(self):
+        """Guarda un GeoParquet por estado con las secciones del shapefile (paso offline)"""
+        print(f"📦 Particionando {self.shp_path} por ENTIDAD...")
+        gdf = gpd.read_file(self.shp_path)
+        ids = pd.to_numeric(gdf['ENTIDAD'], errors='coerce')
+        self.parquet_dir.mkdir(parents=True, exist_ok=True)
+        
+        for estado_id, gdf_estado in gdf.groupby(ids, sort=True):
+            escribir_atomico(self._ruta_geometria(estado_id), lambda tmp: gdf_estado.to_parquet(tmp, index=False))
+            print(f"   ✓ {ESTADOS.get(int(estado_id), estado_id)}: {len(gdf_estado):,} geometrías")
+        
+        self._sellar_particiones('secciones')
+        print(f"✅ Geometrías listas en {self.parquet_dir}")
+
+    @staticmethod
+    def _tipo_columna(col):
+        """Familia de una columna del maestro: 'id', 'texto', 'porcentaje', 'votos' o 'numero'"""
+        if col in ['ID_ENTIDAD', 'SECCION']:
+            return 'id'
+        if (col.startswith('TIPO_') or col.startswith('TENDENCIA_') or
+                col in ['GANADOR_2024', 'SEGUNDO_2024', 'TIPO_SECCION']):
+            return 'texto'
+        if 'PARTICIPACION' in col or 'ABSTENCION' in col:
+            return 'porcentaje'
+        if col.startswith('TOTAL_VOTOS_') or col.startswith('LISTA_NOMINAL_'):
+            return 'votos'
+        nombre, _, year = col.rpartition('_')
+        if year in years and (nombre in base_parties or nombre in coaliciones):
+            return 'votos'
+        return 'numero'
+
+    def _dtypes_lectura(self, columnas, numericos=True):
+        """Mapa de dtypes explícito para read_csv.
+        
+        Ids enteros, etiquetas como texto y, con `numericos`, votos y métricas
+        (shares, cambios, competitividad...) como float64. Los porcentajes traen
+        '%' y se dejan al parser para limpiarlos después en una sola pasada.
+        """
+        dtypes = {'ID_ENTIDAD': 'int16', 'SECCION': 'int32'}
+        for c in columnas:
+            tipo = self._tipo_columna(c)
+            if tipo == 'texto':
+                dtypes[c] = 'object'
+            elif numericos and tipo in ['votos', 'numero']:
+                dtypes[c] = 'float64'
+        return {c: t for c, t in dtypes.items() if c in columnas}
+
+    def _leer_csv(self, columnas=None):
+        """Lee el CSV maestro (o solo `columnas`) ya tipado.
+        
+        El parser resuelve los separadores de miles y el marcador '-', así que las
+        columnas numéricas llegan como float sin pasar por texto. El '-' vale 0
+        (como siempre) y una celda vacía queda como faltante: el parser lee ambos
+        como NaN, y solo las columnas con NaN se releen como texto para poner los
+        ceros. Si alguna columna trae otro valor no numérico se vuelve a leer
+        infiriendo tipos y _process_csv_columns limpia solo esas.
+        """
+        if columnas is None:
+            columnas = pd.read_csv(self.csv_path, nrows=0).columns.tolist()
+        opciones = dict(usecols=columnas, thousands=',', low_memory=False)
+        try:
+            df = pd.read_csv(self.csv_path, dtype=self._dtypes_lectura(columnas),
+                             na_values=['-'], **opciones)
+        except ValueError as e:
+            print(f"    ⚠️ Valores no numéricos en el CSV ({e}), limpiando columna por columna")
+            return pd.read_csv(self.csv_path, dtype=self._dtypes_lectura(columnas, numericos=False), **opciones)
+        
+        con_faltantes = [c for c in df.columns
+                         if self._tipo_columna(c) not in ['id', 'texto'] and df[c].isna().any()]
+        if con_faltantes:
+            texto = pd.read_csv(self.csv_path, usecols=con_faltantes, dtype=str,
+                                keep_default_na=False, low_memory=False)
+            for col in con_faltantes:
+                df[col] = df[col].mask(texto[col].str.strip() == '-', 0)
+        return df
+
+    def _process_csv_columns(self, df):
+        """Procesa columnas numéricas del CSV.
+        
+        Las columnas que pandas ya leyó como numéricas no se tocan; solo las que
+        llegaron como texto ('45.2%', '1,234', '-') se limpian en una pasada. El
+        marcador '-' vale 0 en todas las columnas numéricas.
+        """
+        for col in df.columns:
+            tipo = self._tipo_columna(col)
+            if tipo in ['id', 'texto']:
+                continue
+            
+            serie = df[col]
+            if not pd.api.types.is_numeric_dtype(serie):
+                # '-' es cero; cualquier otro marcador queda como faltante
+                limpia = serie.astype(str).str.replace(r'[%,]', '', regex=True).replace('-', '0')
+                serie = pd.to_numeric(limpia, errors='coerce')
+            
+            if tipo == 'porcentaje':
+                serie = serie.clip(0, 100)
+            
+            df[col] = serie
         
         return df
     
-    def _process_shapefile(self, gdf):
+    def _process_shapefile(self, gdf, simplificar=True):
         """Procesa shapefile con simplificación y conversiones"""
         gdf['SECCION'] = pd.to_numeric(gdf['SECCION'], errors='coerce').astype('Int64')
         
@@ -402,12 +1420,16 @@ class VisualizadorElectoral:
         if gdf.crs is None or gdf.crs.to_epsg() != 4326:
             gdf = gdf.to_crs(epsg=4326)
         
-        gdf['geometry'] = gdf['geometry'].simplify(tolerance=0.001, preserve_topology=True)
+        if simplificar:
+            gdf['geometry'] = gdf['geometry'].simplify(tolerance=0.001, preserve_topology=True)
         
         return gdf
     
     def get_available_states(self):
         """Obtiene lista de estados disponibles sin cargar todos los datos"""
+        if self.usa_parquet():
+            return sorted(int(p.stem.split('_')[1]) for p in self.parquet_dir.glob('estado_*.parquet'))
+        
         try:
             # Leer solo la columna ID_ENTIDAD del CSV
             df_estados = pd.read_csv(self.csv_path, usecols=['ID_ENTIDAD'], dtype={'ID_ENTIDAD': 'int16'})
@@ -434,21 +1456,59 @@ class VisualizadorElectoral:
         
         df['MC_TOTAL'] = get_col_safe(df, 'MC_2024')
         
-        def determinar_ganador_coalicion(row):
-            votos = {
-                'COALICION_OPOSITORA': row.get('COALICION_OPOSITORA', 0),
-                'COALICION_OFICIALISTA': row.get('COALICION_OFICIALISTA', 0),
-                'MC': row.get('MC_TOTAL', 0)
-            }
-            return max(votos, key=votos.get) if max(votos.values()) > 0 else 'SIN_DATOS'
-        
-        df['GANADOR_COALICION'] = df.apply(determinar_ganador_coalicion, axis=1)
+        # Argmax sobre la matriz de coaliciones (mismo desempate que max() sobre el dict)
+        ranking = calcular_ranking(
+            df[['COALICION_OPOSITORA', 'COALICION_OFICIALISTA', 'MC_TOTAL']].to_numpy(),
+            ['COALICION_OPOSITORA', 'COALICION_OFICIALISTA', 'MC']
+        )
+        df['GANADOR_COALICION'] = ranking['ganador']
         return df
 
+    def ranking_partidos(self, nivel, estado_id, year='2024', df=None):
+        """Ganador, segundo lugar, votos, porcentaje y margen por unidad territorial.
+        
+        Se calcula una vez por (estado, nivel, año) y lo comparten el mapa de
+        ganadores, el panel de estadísticas y cualquier otra vista. El índice
+        coincide con el de agregar_por_nivel(nivel, estado_id).
+        """
+        clave = (estado_id, nivel, year)
+        resultado = self._derivado(self.cache_rankings, clave)
+        if resultado is None:
+            if df is None:
+                df = self.agregar_atributos(nivel, estado_id)
+            
+            party_cols = [f"{p}_{year}" for p in base_parties if f"{p}_{year}" in df.columns]
+            ranking = calcular_ranking(
+                df[party_cols].to_numpy(),
+                [c.replace(f'_{year}', '') for c in party_cols],
+                sin_datos='SIN_VOTOS'
+            )
+            
+            resultado = pd.DataFrame({
+                'GANADOR': ranking['ganador'],
+                'SEGUNDO': ranking['segundo'],
+                'VOTOS_GANADOR': ranking['votos_ganador'],
+                'VOTOS_SEGUNDO': ranking['votos_segundo'],
+                'TOTAL_VOTOS': ranking['total'],
+                'MARGEN': ranking['margen'],
+            }, index=df.index)
+            
+            con_votos = resultado['TOTAL_VOTOS'] > 0
+            resultado['PORCENTAJE_GANADOR'] = np.where(
+                con_votos, resultado['VOTOS_GANADOR'] / resultado['TOTAL_VOTOS'].where(con_votos, 1) * 100, 0.0
+            )
+            resultado['MARGEN_PCT'] = np.where(
+                con_votos, resultado['MARGEN'] / resultado['TOTAL_VOTOS'].where(con_votos, 1) * 100, 0.0
+            )
+            
+            resultado = self._guardar_derivado(self.cache_rankings, clave, resultado)
+        
+        return resultado
+
     def agregar_por_nivel(self, nivel, estado_id=None):
-        # OPTIMIZACIÓN: Cargar estado bajo demanda
-        if estado_id is None:
-            raise ValueError("❌ Debe especificar un estado (modo optimizado)")
+        # Sin estado: vista nacional precompilada (no carga ningún estado)
+        if not estado_id:
+            return self.cargar_nacional(nivel)
         
         # Cargar datos del estado (usa cache si ya está cargado)
         df = self.load_state(estado_id)
@@ -456,18 +1516,86 @@ class VisualizadorElectoral:
         if nivel == 'SECCION':
             return df
         
-        col_map = {
-            'DISTRITO_FEDERAL': 'DISTRITO_FEDERAL',
-            'DISTRITO_LOCAL': 'DISTRITO_LOCAL',
-            'MUNICIPIO': 'MUNICIPIO'
-        }
+        # Mapa, estadísticas y gráficos piden el mismo nivel (a veces en paralelo):
+        # disolver una sola vez
+        clave = (estado_id, nivel)
+        with self._candado(('nivel',) + clave):
+            gdf_dissolved = self._derivado(self.cache_niveles, clave)
+            if gdf_dissolved is not None:
+                print(f"  💾 Usando cache de {nivel} para estado {estado_id}")
+                return gdf_dissolved
+            
+            gdf_dissolved = self._leer_nivel(nivel, estado_id)
+            if gdf_dissolved is None:
+                gdf_dissolved = self._disolver_nivel(df, nivel, estado_id)
+                self._guardar_nivel(gdf_dissolved, nivel, estado_id)
+            return self._guardar_derivado(self.cache_niveles, clave, gdf_dissolved)
+
+    def _ruta_nivel(self, nivel, estado_id):
+        """GeoParquet de un nivel ya agregado y unido a sus límites.
+        
+        El nombre lleva el hash de las fuentes (CSV y SHP) y de las versiones del
+        pipeline; sin fuentes presentes se usa el que exista.
+        """
+        prefijo = f'nivel_{nivel}_{int(estado_id):02d}'
+        firma = self._firma_fuentes()
+        if firma:
+            firma = hashlib.sha1(f'{firma}|v{self.VERSION_LIMITES}'.encode()).hexdigest()[:12]
+            return self.parquet_dir / f'{prefijo}_{firma}.parquet'
+        return next(iter(sorted(self.parquet_dir.glob(f'{prefijo}_*.parquet'))), None)
+
+    def _leer_nivel(self, nivel, estado_id):
+        ruta = self._ruta_nivel(nivel, estado_id)
+        if ruta is None or not ruta.exists():
+            return None
+        try:
+            gdf = gpd.read_parquet(ruta)
+            print(f"  📐 {nivel}: {len(gdf)} unidades precalculadas ({ruta.name})")
+            return gdf
+        except Exception as e:
+            print(f"    ⚠️ Error leyendo {ruta.name}: {e}")
+            return None
+
+    def _guardar_nivel(self, gdf, nivel, estado_id):
+        """Escribe el nivel de forma atómica y borra los de fuentes anteriores"""
+        ruta = self._ruta_nivel(nivel, estado_id)
+        if ruta is None:
+            return
+        try:
+            self.parquet_dir.mkdir(parents=True, exist_ok=True)
+            escribir_atomico(ruta, lambda tmp: gdf.to_parquet(tmp, index=False))
+            for viejo in ruta.parent.glob(f'nivel_{nivel}_{int(estado_id):02d}_*.parquet'):
+                if viejo != ruta:
+                    viejo.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"    ⚠️ No se pudo guardar {nivel} en disco: {e}")
+
+    def agregar_atributos(self, nivel, estado_id=None):
+        """Sumas y promedios por unidad del nivel, sin geometría.
+        
+        Es lo que necesitan el panel de estadísticas y los gráficos; comparte
+        índice y columnas con agregar_por_nivel, salvo los polígonos.
+        """
+        if not estado_id:
+            return self.cargar_nacional(nivel)
         
-        col_agrupacion = col_map.get(nivel, nivel)
+        df = self.load_state(estado_id)
         
-        if col_agrupacion not in df.columns:
-            print(f"⚠️ Columna {col_agrupacion} no encontrada, usando SECCION")
+        if nivel == 'SECCION':
             return df
         
+        clave = (estado_id, nivel)
+        with self._lock_derivados:
+            atributos = self.cache_niveles.get(clave)
+            if atributos is None:
+                atributos = self.cache_atributos.get(clave)
+        if atributos is None:
+            atributos = self._guardar_derivado(self.cache_atributos, clave, self._agregar_atributos(df, nivel))
+        return atributos
+
+    @staticmethod
+    def _columnas_agregacion(df):
+        """Función de agregación ('sum' o 'mean') de cada columna numérica"""
         cols_sumar = []
         for year in years:
             for partido in base_parties:
@@ -492,7 +1620,7 @@ class VisualizadorElectoral:
                 if pd.api.types.is_numeric_dtype(df[col]):
                     cols_sumar.append(col)
         
-        cols_sumar = [c for c in set(cols_sumar) if c in df.columns and pd.api.types.is_numeric_dtype(df[c])]
+        cols_sumar = [c for c in dict.fromkeys(cols_sumar) if c in df.columns and pd.api.types.is_numeric_dtype(df[c])]
         
         cols_promediar = []
         for col in df.columns:
@@ -508,79 +1636,54 @@ class VisualizadorElectoral:
         
         agg_dict = {col: 'sum' for col in cols_sumar}
         agg_dict.update({col: 'mean' for col in cols_promediar})
+        return agg_dict
+
+    def _agregar_atributos(self, df, nivel):
+        """Rollup de atributos en una sola pasada groupby().agg() (sin geometría)"""
+        if nivel not in df.columns:
+            print(f"⚠️ Columna {nivel} no encontrada, usando SECCION")
+            return df
+        
+        group_cols = [nivel]
+        agg_dict = self._columnas_agregacion(df)
         
-        group_cols = [col_agrupacion]
-        if 'ID_ENTIDAD' in df.columns and estado_id is None:
-            group_cols.append('ID_ENTIDAD')
+        atributos = df.groupby(group_cols).agg(agg_dict).astype('float64').reset_index()
+        
+        # Recalcular coaliciones después de agregar
+        atributos = self.calcular_coaliciones(atributos)
         
+        # CORRECCIÓN: Convertir columnas Int64 a float para JSON (solo niveles agregados)
+        for col in atributos.columns:
+            if str(atributos[col].dtype) == 'Int64':
+                atributos[col] = atributos[col].fillna(0).astype('float64')
+        
+        return atributos
+
+    def _disolver_nivel(self, df, nivel, estado_id):
+        """Agrega las secciones de un estado al nivel indicado (atributos + polígonos)"""
+        atributos = self.agregar_atributos(nivel, estado_id)
+        gdf_dissolved = self._unir_limites(df, atributos, nivel, estado_id)
+        
+        # Las consultas sin geometría pueden usar ya el resultado completo
+        with self._lock_derivados:
+            self.cache_atributos.pop((estado_id, nivel), None)
+        
+        return gdf_dissolved
+
+    def _unir_limites(self, df, atributos, nivel, estado_id):
+        """Une los atributos agregados de un nivel con sus polígonos disueltos"""
+        if nivel not in df.columns:
+            return atributos
+        
+        group_cols = [nivel]
         gdf_temp = gpd.GeoDataFrame(df, geometry='geometry')
         
         try:
-            # CORRECCIÓN: Buffer + Unary_union para cerrar gaps en niveles agregados
             if nivel in ['MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']:
-                print(f"  🔧 Procesando {nivel} (cerrando gaps)...")
-                
-                grouped = gdf_temp.groupby(group_cols)
-                result_list = []
-                
-                for name, group in grouped:
-                    # Validar y reparar geometrías antes de procesar
-                    if not group.geometry.is_valid.all():
-                        group = group.copy()
-                        group['geometry'] = group.geometry.buffer(0)
-                    
-                    try:
-                        # Buffer positivo pequeño para cerrar gaps
-                        geoms_buffered = group.geometry.buffer(0.0008)
-                        
-                        # Unary union: fusiona todo en un solo polígono
-                        merged_geom = geoms_buffered.unary_union
-                        
-                        # Buffer negativo para regresar al tamaño original
-                        merged_geom = merged_geom.buffer(-0.0006)
-                        
-                        # Simplificar contorno
-                        merged_geom = merged_geom.simplify(0.002, preserve_topology=True)
-                        
-                        # Validar geometría final
-                        if not merged_geom.is_valid:
-                            merged_geom = merged_geom.buffer(0)
-                        
-                    except Exception as geom_error:
-                        print(f"    ⚠️ Error procesando geometría: {geom_error}")
-                        merged_geom = group.geometry.unary_union
-                        if not merged_geom.is_valid:
-                            merged_geom = merged_geom.buffer(0)
-                    
-                    # Preparar datos agregados
-                    row_data = {}
-                    if len(group_cols) == 1:
-                        row_data[group_cols[0]] = name
-                    else:
-                        for i, col in enumerate(group_cols):
-                            row_data[col] = name[i]
-                    
-                    # Aplicar agregaciones
-                    for col, func in agg_dict.items():
-                        if col in group.columns:
-                            try:
-                                if func == 'sum':
-                                    row_data[col] = float(group[col].sum())
-                                elif func == 'mean':
-                                    row_data[col] = float(group[col].mean())
-                            except:
-                                row_data[col] = 0.0
-                    
-                    row_data['geometry'] = merged_geom
-                    result_list.append(row_data)
-                
-                gdf_dissolved = gpd.GeoDataFrame(result_list, crs=gdf_temp.crs)
-                print(f"  ✅ {nivel}: {len(gdf_dissolved)} polígonos procesados")
-            
+                # CORRECCIÓN: polígonos sin huecos (del disco si ya se disolvieron para este shapefile)
+                limites = self._limites_nivel(gdf_temp, nivel, estado_id, group_cols)
             else:
-                # Para SECCION, usar dissolve estándar
-                gdf_dissolved = gdf_temp.dissolve(by=group_cols, aggfunc=agg_dict)
-                gdf_dissolved = gdf_dissolved.reset_index()
+                limites = gdf_temp[group_cols + ['geometry']].dissolve(by=group_cols).reset_index()
         
         except Exception as e:
             print(f"⚠️ Error al disolver geometrías: {e}")
@@ -588,25 +1691,109 @@ class VisualizadorElectoral:
             traceback.print_exc()
             
             # Fallback seguro
-            gdf_dissolved = gdf_temp.groupby(group_cols).agg(agg_dict).reset_index()
-            geometry_col = gdf_temp.groupby(group_cols)['geometry'].first()
-            gdf_dissolved = gdf_dissolved.merge(
-                geometry_col.reset_index(), 
-                on=group_cols, 
-                how='left'
+            limites = gdf_temp.groupby(group_cols)['geometry'].first().reset_index()
+        
+        # Unir los atributos a los polígonos (las llaves de los atributos ya son float)
+        limites = limites.astype({col: atributos[col].dtype for col in group_cols})
+        gdf_dissolved = gpd.GeoDataFrame(
+            atributos.merge(limites, on=group_cols, how='left'),
+            geometry='geometry', crs=gdf_temp.crs
+        )
+        print(f"  ✅ {nivel}: {len(gdf_dissolved)} polígonos procesados")
+        return gdf_dissolved
+
+    def _firma_shapefile(self):
+        """Hash del shapefile (tamaño/fecha de .shp, .shx y .dbf) y de la versión de la disolución"""
+        base_shp = os.path.splitext(self.shp_path)[0]
+        partes = [f'v{self.VERSION_LIMITES}']
+        for ext in ['.shp', '.shx', '.dbf']:
+            if os.path.exists(base_shp + ext):
+                info = os.stat(base_shp + ext)
+                partes.append(f'{ext}:{info.st_size}:{int(info.st_mtime)}')
+        
+        if len(partes) == 1:
+            return None
+        return hashlib.sha1('|'.join(partes).encode()).hexdigest()[:12]
+
+    def _ruta_limites(self, nivel, estado_id):
+        """GeoParquet con los polígonos disueltos de un nivel, ligado al hash del shapefile.
+        
+        Sin shapefile presente (deploy solo con archivos precalculados) se usa el
+        que exista para ese estado y nivel.
+        """
+        prefijo = f'limites_{nivel}_{int(estado_id):02d}'
+        firma = self._firma_shapefile()
+        if firma:
+            return self.parquet_dir / f'{prefijo}_{firma}.parquet'
+        return next(iter(sorted(self.parquet_dir.glob(f'{prefijo}_*.parquet'))), None)
+
+    def _limites_nivel(self, gdf, nivel, estado_id, group_cols, secciones=None, workers=1):
+        """Polígonos de un nivel agregado: leídos del disco o disueltos y guardados.
+        
+        `secciones` son las secciones sin simplificar, si ya se leyeron. `workers` > 1
+        solo desde `construir`: en una petición el worker de gunicorn tiene varios hilos
+        y hacer fork de un proceso con hilos puede dejar candados tomados en los hijos.
+        """
+        ruta = self._ruta_limites(nivel, estado_id)
+        if ruta is not None and ruta.exists():
+            try:
+                limites = gpd.read_parquet(ruta)
+                print(f"  📐 {nivel}: {len(limites)} polígonos precalculados ({ruta.name})")
+                return limites
+            except Exception as e:
+                print(f"    ⚠️ Error leyendo {ruta.name}: {e}")
+        
+        try:
+            # Las secciones sin simplificar cubren el estado sin huecos: unión de cobertura
+            print(f"  🔧 Procesando {nivel} (unión de cobertura)...")
+            if secciones is None:
+                secciones = self._secciones_estado(estado_id, simplificar=False)
+            limites = self._disolver_geometrias(
+                secciones, group_cols, workers=workers, metodo=disolver_cobertura
             )
-            gdf_dissolved = gpd.GeoDataFrame(gdf_dissolved, geometry='geometry')
+            # Una sola simplificación sobre la red de bordes compartidos de todo el nivel
+            limites['geometry'] = simplificar_cobertura(limites.geometry, TOLERANCIA_LIMITES)
+        except Exception as e:
+            # Sin geometría original (p. ej. deploy solo con artefactos): buffer sobre las simplificadas
+            print(f"    ⚠️ Unión de cobertura no disponible ({e}), cerrando gaps con buffer...")
+            limites = self._disolver_geometrias(gdf, group_cols, workers=workers)
         
-        # Recalcular coaliciones después de agregar
-        gdf_dissolved = self.calcular_coaliciones(gdf_dissolved)
+        if ruta is not None:
+            try:
+                self.parquet_dir.mkdir(parents=True, exist_ok=True)
+                escribir_atomico(ruta, lambda tmp: limites.to_parquet(tmp, index=False))
+                # Los límites de versiones anteriores del shapefile ya no sirven
+                for viejo in ruta.parent.glob(f'limites_{nivel}_{int(estado_id):02d}_*.parquet'):
+                    if viejo != ruta:
+                        viejo.unlink(missing_ok=True)
+            except Exception as e:
+                print(f"    ⚠️ No se pudieron guardar los límites de {nivel}: {e}")
         
-        # CORRECCIÓN: Convertir columnas Int64 a float para JSON (solo niveles agregados)
-        if nivel in ['MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']:
-            for col in gdf_dissolved.columns:
-                if str(gdf_dissolved[col].dtype) == 'Int64':
-                    gdf_dissolved[col] = gdf_dissolved[col].fillna(0).astype('float64')
+        return limites
+
+    @staticmethod
+    def _disolver_geometrias(gdf, group_cols, workers=1, metodo=None):
+        """Disuelve las secciones por grupo (solo geometría).
+        
+        `metodo` recibe las geometrías de un grupo y devuelve el polígono unido
+        (por defecto disolver_grupo, con buffer). Con workers > 1 los grupos se
+        reparten en un pool de procesos con el mismo resultado que el secuencial.
+        """
+        metodo = metodo or disolver_grupo
+        nombres, geometrias = [], []
+        for name, group in gdf.groupby(group_cols):
+            nombres.append(name if isinstance(name, tuple) else (name,))
+            geometrias.append(group.geometry)
+        
+        if workers > 1 and len(geometrias) >= 2 * workers:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(geometrias) // (workers * 4))
+                disueltas = list(pool.map(metodo, geometrias, chunksize=chunksize))
+        else:
+            disueltas = [metodo(geoms) for geoms in geometrias]
         
-        return gdf_dissolved
+        filas = [dict(zip(group_cols, name), geometry=geom) for name, geom in zip(nombres, disueltas)]
+        return gpd.GeoDataFrame(filas, columns=group_cols + ['geometry'], geometry='geometry', crs=gdf.crs)
 
     @staticmethod
     def _sanitize_for_json(gdf):
@@ -638,7 +1825,192 @@ class VisualizadorElectoral:
         
         return gdf_safe
 
-    def crear_mapa(self, metrica, nivel='SECCION', estado_id=None, mostrar_ganador=False, opacidad=0.65):
+    def crear_mapa(self, metrica, nivel='SECCION', estado_id=None, mostrar_ganador=False, opacidad=0.65,
+                   zoom=None, centro=None):
+        """Mapa de la métrica; `zoom`/`centro` son la vista actual del usuario (si se conoce).
+        
+        El zoom decide qué nivel de la pirámide de geometría se envía: en la vista
+        general del estado viajan polígonos mucho más simplificados.
+        """
+        if not estado_id:
+            estado_id, nivel = None, self.nivel_nacional(nivel)
+        if zoom is None:
+            zoom = 7 if estado_id else 4
+        
+        if self._usar_teselas(nivel, estado_id):
+            fig = self._mapa_teselas(metrica, nivel, estado_id, mostrar_ganador, opacidad)
+        else:
+            fig = self._construir_mapa(metrica, nivel, estado_id, mostrar_ganador, opacidad, zoom)
+        
+        # Conservar la vista del usuario al cambiar de resolución
+        if centro is not None:
+            fig.update_mapboxes(center=centro, zoom=zoom)
+        
+        return fig
+
+    def geometria_nivel(self, nivel, estado_id, tolerancia, gdf=None):
+        """Geometrías de la pirámide para una tolerancia (cacheadas por estado, nivel y tolerancia)"""
+        if gdf is None:
+            gdf = self.agregar_por_nivel(nivel, estado_id)
+        
+        tolerancia_base = 0.001 if nivel == 'SECCION' else 0.002
+        if tolerancia <= tolerancia_base:
+            return gdf.geometry
+        
+        clave = (estado_id, nivel, tolerancia)
+        geometrias = self._derivado(self.cache_piramide, clave)
+        if geometrias is None:
+            print(f"  🔺 Geometría {nivel} con tolerancia {tolerancia}")
+            # Vecinos con el mismo borde simplificado: sin astillas entre unidades al alejar
+            geometrias = self._guardar_derivado(self.cache_piramide, clave, gpd.GeoSeries(
+                simplificar_cobertura(gdf.geometry, 2 * tolerancia), index=gdf.index, crs=gdf.crs
+            ))
+        return geometrias
+
+    def geojson_nivel(self, nivel, estado_id, tolerancia, gdf=None):
+        """
+        GeoJSON solo de geometría (texto) y su versión, cacheado por estado, nivel y tolerancia.
+        Los ids son el índice del GeoDataFrame del nivel: todas las métricas comparten
+        el mismo GeoJSON y las figuras solo aportan locations/z.
+        """
+        clave = (estado_id, nivel, tolerancia)
+        guardado = self._derivado(self.cache_geojson, clave)
+        if guardado is None:
+            if gdf is None:
+                gdf = self.agregar_por_nivel(nivel, estado_id)
+            
+            geometrias = self.geometria_nivel(nivel, estado_id, tolerancia, gdf=gdf)
+            if not geometrias.is_valid.all():
+                print("  🔧 Reparando geometrías inválidas...")
+                geometrias = geometrias.buffer(0)
+            
+            texto = json.dumps(geojson_compacto(geometrias, gdf.index, self.decimales_geojson),
+                               separators=(',', ':'))
+            version = hashlib.sha1(texto.encode()).hexdigest()[:12]
+            print(f"  🗺️ GeoJSON {nivel} (tolerancia {tolerancia}): {len(texto) / 2**20:.1f} MB")
+            guardado = self._guardar_derivado(self.cache_geojson, clave, (texto, version))
+        return guardado
+
+    def _geojson_figura(self, nivel, estado_id, zoom, gdf):
+        """Valor de `geojson` para las trazas: URL del GeoJSON cacheado si la app lo sirve
+        (el navegador lo descarga una vez por versión) o el objeto completo si no."""
+        tolerancia = tolerancia_para_zoom(zoom)
+        texto, version = self.geojson_nivel(nivel, estado_id, tolerancia, gdf=gdf)
+        if self.url_geojson is None:
+            return json.loads(texto)
+        return f"{self.url_geojson}/{estado_id or 0}/{nivel}/{tolerancia}.json?v={version}"
+
+    def _usar_teselas(self, nivel, estado_id):
+        """True si el mapa se dibuja con teselas vectoriales en lugar de GeoJSON"""
+        if self.url_teselas is None or self.teselas_desde is None or nivel != 'SECCION' or estado_id is None:
+            return False
+        return len(self.agregar_por_nivel(nivel, estado_id)) >= self.teselas_desde
+
+    def _cajas_nivel(self, nivel, estado_id):
+        """Geometrías, ids y cajas envolventes del nivel (para elegir qué entra en cada tesela)"""
+        clave = (estado_id, nivel)
+        cajas = self._derivado(self.cache_cajas, clave)
+        if cajas is None:
+            gdf = self.agregar_por_nivel(nivel, estado_id)
+            geometrias = np.asarray(gdf.geometry)
+            cajas = self._guardar_derivado(self.cache_cajas, clave,
+                                           (geometrias, np.asarray(gdf.index), shapely.bounds(geometrias)))
+        return cajas
+
+    def tesela(self, nivel, estado_id, z, x, y, clase=None, metrica=None, mostrar_ganador=False):
+        """
+        Tesela MVT (bytes) del nivel, con los mismos ids que el GeoJSON.
+        Con `clase` solo incluye las unidades de esa clase de color del mapa de `metrica`.
+        """
+        clave = (estado_id, nivel, z, x, y)
+        features = self.cache_teselas.obtener(clave)
+        if features is None:
+            geometrias, ids, cajas = self._cajas_nivel(nivel, estado_id)
+            lon_min, lat_min, lon_max, lat_max = limites_tesela(z, x, y, MARGEN_TESELA / EXTENSION_TESELA)
+            dentro = ((cajas[:, 0] <= lon_max) & (cajas[:, 2] >= lon_min) &
+                      (cajas[:, 1] <= lat_max) & (cajas[:, 3] >= lat_min))
+            features = geometrias_a_tesela(geometrias[dentro], ids[dentro], z, x, y)
+            self.cache_teselas.guardar(clave, features, tamano=64 + sum(8 * len(c) for _, c in features))
+        
+        if clase is not None:
+            por_id = self.clases_mapa(metrica, nivel, estado_id, mostrar_ganador)['por_id']
+            features = [(id_, comandos) for id_, comandos in features if por_id.get(id_) == clase]
+        return codificar_mvt(nivel, features)
+
+    def clases_mapa(self, metrica, nivel, estado_id, mostrar_ganador=False, fig=None):
+        """
+        Clase de color de cada unidad para dibujar el mapa con teselas.
+        Sale de la misma figura que el mapa con GeoJSON (`fig`, si ya se construyó),
+        así que escalas, rangos y colores coinciden: los mapas categóricos usan su
+        código de categoría y los continuos se parten en CLASES_TESELAS tramos de la escala.
+        Solo se cachean las clases, no la figura.
+        """
+        clave = (estado_id, nivel, metrica, bool(mostrar_ganador))
+        clases = self.cache_clases.obtener(clave)
+        if clases is None:
+            if fig is None:
+                fig = self._construir_mapa(metrica, nivel, estado_id, mostrar_ganador, 0.65, 7,
+                                           sin_geometria=True)
+            traza = next((t for t in fig.data if t.type == 'choroplethmapbox'), None)
+            
+            por_id, colores = {}, []
+            if traza is not None and len(fig.data) > 1:
+                # Categórico: z ya es el código y la escala es escalonada (dos puntos por color)
+                colores = [color for _, color in traza.colorscale[::2]]
+                por_id = dict(zip(np.asarray(traza.locations).astype(int).tolist(),
+                                  np.asarray(traza.z).astype(int).tolist()))
+            elif traza is not None:
+                eje = fig.layout.coloraxis
+                n = CLASES_TESELAS
+                z = np.asarray(traza.z, dtype=float)
+                tramo = np.floor((z - eje.cmin) / max(eje.cmax - eje.cmin, 1e-9) * n)
+                validos = np.isfinite(tramo)
+                colores = sample_colorscale([list(punto) for punto in eje.colorscale],
+                                            [(k + 0.5) / n for k in range(n)])
+                por_id = dict(zip(np.asarray(traza.locations)[validos].astype(int).tolist(),
+                                  np.clip(tramo[validos], 0, n - 1).astype(int).tolist()))
+            
+            clases = {'por_id': por_id, 'colores': colores}
+            # ~100 bytes por entrada del diccionario (llave, valor y hueco de la tabla)
+            self.cache_clases.guardar(clave, clases, tamano=100 * len(por_id) + 1024)
+        return clases
+
+    def _mapa_teselas(self, metrica, nivel, estado_id, mostrar_ganador, opacidad):
+        """Mapa sin GeoJSON: una capa de teselas por clase de color (mapbox no colorea por propiedad)"""
+        fig = self._construir_mapa(metrica, nivel, estado_id, mostrar_ganador, 0.65, 7, sin_geometria=True)
+        clases = self.clases_mapa(metrica, nivel, estado_id, mostrar_ganador, fig=fig)
+        continuo = len(fig.data) == 1
+        fig.data = [traza for traza in fig.data if traza.type != 'choroplethmapbox']
+        
+        # Barra de color de los mapas continuos, sostenida por una traza vacía
+        if continuo:
+            fig.add_trace(go.Scattermapbox(
+                lat=[None], lon=[None], mode='markers',
+                marker=dict(color=[fig.layout.coloraxis.cmin], coloraxis='coloraxis'),
+                showlegend=False, hoverinfo='skip'
+            ))
+        
+        ruta = f"{self.url_teselas}/{nivel}/{{z}}/{{x}}/{{y}}.pbf?"
+        # Las teselas se cachean en el navegador: la versión de los datos va en la URL
+        # para que tras una reconstrucción no se pinten con las clases viejas
+        version = self.version_datos()
+        consulta = {'estado': estado_id, 'metrica': metrica, 'ganador': int(bool(mostrar_ganador)), 'v': version}
+        presentes = set(clases['por_id'].values())
+        capas = [
+            dict(sourcetype='vector', source=[ruta + urlencode({**consulta, 'clase': k})],
+                 sourcelayer=nivel, type='fill', color=color, opacity=opacidad)
+            for k, color in enumerate(clases['colores']) if k in presentes
+        ]
+        capas.append(dict(sourcetype='vector', source=[ruta + urlencode({'estado': estado_id, 'v': version})],
+                          sourcelayer=nivel, type='line', color='rgba(50,50,50,0.3)', line=dict(width=0.2)))
+        
+        fig.update_layout(mapbox_layers=capas)
+        print(f"  🧩 Mapa con teselas vectoriales: {len(capas) - 1} clases de color")
+        return fig
+
+    def _construir_mapa(self, metrica, nivel, estado_id, mostrar_ganador, opacidad, zoom, sin_geometria=False):
+        """Figura del mapa con GeoJSON. Con `sin_geometria` (modo teselas) solo se calculan
+        valores, escalas y colores: no se serializa ni se cachea el GeoJSON del nivel."""
         df_plot = self.agregar_por_nivel(nivel, estado_id)
         
         if len(df_plot) == 0:
@@ -649,16 +2021,23 @@ class VisualizadorElectoral:
                 font=dict(size=20, color='red')
             )
         
-        gdf_plot = gpd.GeoDataFrame(df_plot, geometry='geometry')
+        # Geometría según el zoom, serializada una sola vez por estado y nivel
+        if sin_geometria:
+            geojson = {'type': 'FeatureCollection', 'features': []}
+        else:
+            geojson = self._geojson_figura(nivel, estado_id, zoom, df_plot)
+        
+        # Los valores viajan aparte: solo atributos, sin geometría
+        gdf_plot = pd.DataFrame(df_plot.drop(columns='geometry'))
         
         if mostrar_ganador or metrica == 'Por partidos':
-            return self._crear_mapa_ganador(gdf_plot, nivel, estado_id, opacidad)
+            return self._crear_mapa_ganador(gdf_plot, geojson, nivel, estado_id, opacidad)
         
         if metrica == 'TIPO_SECCION_ESTRATEGICA' and 'TIPO_SECCION_ESTRATEGICA' in gdf_plot.columns:
-            return self._crear_mapa_tipo_seccion(gdf_plot, nivel, estado_id, opacidad)
+            return self._crear_mapa_tipo_seccion(gdf_plot, geojson, nivel, estado_id, opacidad)
         
         if 'TENDENCIA_HISTORICA' in metrica and metrica in gdf_plot.columns:
-            return self._crear_mapa_tendencia(gdf_plot, metrica, nivel, estado_id, opacidad)
+            return self._crear_mapa_tendencia(gdf_plot, geojson, metrica, nivel, estado_id, opacidad)
         
         if metrica not in df_plot.columns:
             return go.Figure().add_annotation(
@@ -720,28 +2099,12 @@ class VisualizadorElectoral:
                 max_val = gdf_plot[column_to_plot].quantile(0.95)
                 color_scale = 'Reds'
             else:
-                gdf_plot['porcentaje'] = gdf_plot.apply(
-                    lambda x: (x[metrica] / x[total_column] * 100) if x[total_column] > 0 else 0,
-                    axis=1
-                )
+                total = gdf_plot[total_column]
+                gdf_plot['porcentaje'] = (gdf_plot[metrica] / total * 100).where(total > 0, 0)
                 column_to_plot = 'porcentaje'
                 max_val = gdf_plot[column_to_plot].quantile(0.95)
                 color_scale = 'Reds'
         
-        # Validar geometrías antes de convertir
-        if not gdf_plot.geometry.is_valid.all():
-            print("  🔧 Reparando geometrías inválidas...")
-            gdf_plot['geometry'] = gdf_plot.geometry.buffer(0)
-        
-        # CORRECCIÓN: Sanitizar SOLO si NO es nivel SECCION
-        if nivel in ['MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']:
-            print(f"  🔧 Convirtiendo tipos de datos para JSON ({nivel})...")
-            gdf_plot_safe = self._sanitize_for_json(gdf_plot)
-            geojson = json.loads(gdf_plot_safe.to_json())
-        else:
-            # Para SECCION, conversión normal
-            geojson = json.loads(gdf_plot.to_json())
-        
         center_coords = COORDS_ESTADOS.get(estado_id, {'lat': 23.6345, 'lon': -102.5528})
         zoom_level = 7 if estado_id else 4
         
@@ -805,7 +2168,77 @@ class VisualizadorElectoral:
         
         return fig
 
-    def _crear_mapa_ganador(self, gdf_plot, nivel, estado_id, opacidad=0.65):
+    @staticmethod
+    def _columna_o_cero(df, col):
+        """La columna si existe; si no, ceros del mismo largo"""
+        return df[col] if col in df.columns else pd.Series(0, index=df.index)
+
+    @staticmethod
+    def _agregar_capa_categorica(fig, df, geojson, columna, categorias, colores, nombres,
+                                 hover, nivel, opacidad):
+        """
+        Mapa categórico en UNA sola traza: z es el código de la categoría y la escala
+        de colores es escalonada (un color por código). La leyenda se arma con trazas
+        vacías, sin geometría, una por categoría.
+        
+        `hover` es una lista de (plantilla, valores) con `%{v:formato}`; el texto lo
+        arma el navegador a partir de `customdata`, no se formatea fila por fila.
+        """
+        n = len(categorias)
+        if n == 0:
+            return
+        
+        # Encabezado común: categoría, estado y (en secciones) número de sección
+        datos = [
+            df[columna].astype(str).str.replace('_', ' '),
+            df['ID_ENTIDAD'].map(ESTADOS).fillna('N/A') if 'ID_ENTIDAD' in df.columns else 'N/A',
+            df['SECCION'] if 'SECCION' in df.columns else 'N/A'
+        ]
+        plantilla = '<b>%{customdata[0]}</b><br>Estado: %{customdata[1]}<br>'
+        if nivel == 'SECCION':
+            plantilla += 'Sección: %{customdata[2]}<br>'
+        plantilla += '<br>'
+        
+        lineas = []
+        for linea, valores in hover:
+            lineas.append(linea.replace('%{v', f'%{{customdata[{len(datos)}]'))
+            datos.append(valores)
+        plantilla += '<br>'.join(lineas) + '<extra></extra>'
+        
+        customdata = pd.DataFrame(
+            {i: valores for i, valores in enumerate(datos)}, index=df.index
+        ).to_numpy(dtype=object)
+        
+        escala = []
+        for i, color in enumerate(colores):
+            escala += [[i / n, color], [(i + 1) / n, color]]
+        
+        fig.add_trace(go.Choroplethmapbox(
+            geojson=geojson,
+            locations=df['id'],
+            z=pd.Categorical(df[columna], categories=categorias).codes,
+            zmin=-0.5,
+            zmax=n - 0.5,
+            colorscale=escala,
+            showscale=False,
+            marker_line_width=0.2 if nivel == 'SECCION' else 0,
+            marker_line_color='rgba(50,50,50,0.3)' if nivel == 'SECCION' else 'rgba(0,0,0,0)',
+            marker_opacity=opacidad,
+            customdata=customdata,
+            hovertemplate=plantilla,
+            showlegend=False
+        ))
+        
+        for color, nombre in zip(colores, nombres):
+            fig.add_trace(go.Scattermapbox(
+                lat=[None], lon=[None],
+                mode='markers',
+                marker=dict(size=12, color=color),
+                name=nombre,
+                hoverinfo='skip'
+            ))
+
+    def _crear_mapa_ganador(self, gdf_plot, geojson, nivel, estado_id, opacidad=0.65):
         party_cols_2024 = [f"{p}_2024" for p in base_parties if f"{p}_2024" in gdf_plot.columns]
         
         if not party_cols_2024:
@@ -816,30 +2249,15 @@ class VisualizadorElectoral:
                 font=dict(size=16, color='orange')
             )
         
-        gdf_plot['TOTAL_VOTOS'] = gdf_plot[party_cols_2024].sum(axis=1)
-        
-        # CORRECCIÓN: Si no hay votos, marcar como 'SIN_VOTOS' en lugar de asignar PAN por defecto
-        def get_ganador_seguro(row):
-            total = row[party_cols_2024].sum()
-            if total == 0:
-                return 'SIN_VOTOS', 0
-            ganador_col = row[party_cols_2024].idxmax()
-            ganador_partido = ganador_col.replace('_2024', '')
-            votos = row[ganador_col]
-            return ganador_partido, votos
-        
-        gdf_plot[['PARTIDO_PREDOMINANTE', 'VOTOS_GANADOR']] = gdf_plot.apply(
-            lambda row: pd.Series(get_ganador_seguro(row)), axis=1
-        )
-        
-        gdf_plot['PORCENTAJE_GANADOR'] = (gdf_plot['VOTOS_GANADOR'] / gdf_plot['TOTAL_VOTOS'] * 100).fillna(0)
+        # Ranking compartido (las unidades sin votos quedan como 'SIN_VOTOS')
+        ranking = self.ranking_partidos(nivel, estado_id, '2024', df=gdf_plot)
+        gdf_plot['TOTAL_VOTOS'] = ranking['TOTAL_VOTOS']
+        gdf_plot['PARTIDO_PREDOMINANTE'] = ranking['GANADOR']
+        gdf_plot['VOTOS_GANADOR'] = ranking['VOTOS_GANADOR']
+        gdf_plot['PORCENTAJE_GANADOR'] = ranking['PORCENTAJE_GANADOR']
         gdf_plot['COLOR'] = gdf_plot['PARTIDO_PREDOMINANTE'].map(COLORES_PARTIDOS)
         gdf_plot['id'] = gdf_plot.index
         
-        # Validar geometrías
-        if not gdf_plot.geometry.is_valid.all():
-            gdf_plot['geometry'] = gdf_plot.geometry.buffer(0)
-        
         # CORRECCIÓN: Sanitizar solo niveles agregados
         if nivel in ['MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']:
             gdf_plot = self._sanitize_for_json(gdf_plot)
@@ -854,45 +2272,19 @@ class VisualizadorElectoral:
         # CORRECCIÓN: Excluir 'SIN_VOTOS' del mapa
         partidos_presentes = [p for p in partidos_presentes if p != 'SIN_VOTOS']
         
-        for partido in partidos_presentes:
-            df_partido = gdf_plot[gdf_plot['PARTIDO_PREDOMINANTE'] == partido]
-            
-            if len(df_partido) == 0:
-                continue
-            
-            color = COLORES_PARTIDOS.get(partido, '#888888')
-            
-            hover_text = []
-            for idx, row in df_partido.iterrows():
-                estado_nombre = ESTADOS.get(row.get('ID_ENTIDAD'), 'N/A')
-                
-                text = f"<b>{partido}</b><br>Estado: {estado_nombre}<br>"
-                
-                if nivel == 'SECCION':
-                    seccion = row.get('SECCION', 'N/A')
-                    text += f"Sección: {seccion}<br>"
-                
-                text += (
-                    f"<br>"
-                    f"Votos: {row['VOTOS_GANADOR']:,.0f}<br>"
-                    f"Porcentaje: {row['PORCENTAJE_GANADOR']:.1f}%<br>"
-                    f"Total: {row['TOTAL_VOTOS']:,.0f}"
-                )
-                hover_text.append(text)
-            
-            fig.add_trace(go.Choroplethmapbox(
-                geojson=json.loads(df_partido.to_json()),
-                locations=df_partido['id'],
-                z=[1] * len(df_partido),
-                colorscale=[[0, color], [1, color]],
-                showscale=False,
-                marker_line_width=0.2 if nivel == 'SECCION' else 0,
-                marker_line_color='rgba(50,50,50,0.3)' if nivel == 'SECCION' else 'rgba(0,0,0,0)',
-                marker_opacity=opacidad,
-                hovertext=hover_text,
-                hoverinfo='text',
-                name=partido
-            ))
+        df_partido = gdf_plot[gdf_plot['PARTIDO_PREDOMINANTE'].isin(partidos_presentes)]
+        
+        hover = [
+            ('Votos: %{v:,.0f}', df_partido['VOTOS_GANADOR']),
+            ('Porcentaje: %{v:.1f}%', df_partido['PORCENTAJE_GANADOR']),
+            ('Total: %{v:,.0f}', df_partido['TOTAL_VOTOS'])
+        ]
+        
+        self._agregar_capa_categorica(
+            fig, df_partido, geojson, 'PARTIDO_PREDOMINANTE', partidos_presentes,
+            [COLORES_PARTIDOS.get(p, '#888888') for p in partidos_presentes],
+            partidos_presentes, hover, nivel, opacidad
+        )
         
         estado_nombre = ESTADOS.get(estado_id, 'Nacional') if estado_id else 'Nacional'
         
@@ -925,7 +2317,7 @@ class VisualizadorElectoral:
         
         return fig
 
-    def _crear_mapa_tipo_seccion(self, gdf_plot, nivel, estado_id, opacidad=0.65):
+    def _crear_mapa_tipo_seccion(self, gdf_plot, geojson, nivel, estado_id, opacidad=0.65):
         center_coords = COORDS_ESTADOS.get(estado_id, {'lat': 23.6345, 'lon': -102.5528})
         zoom_level = 7 if estado_id else 4
         
@@ -945,46 +2337,18 @@ class VisualizadorElectoral:
         tipos_presentes = gdf_plot['TIPO_SECCION_ESTRATEGICA'].dropna().unique()
         tipos_presentes = [t for t in orden_tipos if t in tipos_presentes]
         
-        for tipo in tipos_presentes:
-            df_tipo = gdf_plot[gdf_plot['TIPO_SECCION_ESTRATEGICA'] == tipo]
-            
-            if len(df_tipo) == 0:
-                continue
-            
-            color = COLORES_TIPO_SECCION.get(tipo, '#888888')
-            
-            hover_text = []
-            for idx, row in df_tipo.iterrows():
-                estado_nombre = ESTADOS.get(row.get('ID_ENTIDAD'), 'N/A')
-                prioridad = row.get('PRIORIDAD_MOVILIZACION', 0)
-                competitividad = row.get('COMPETITIVIDAD', 0)
-                
-                text = f"<b>{tipo.replace('_', ' ')}</b><br>Estado: {estado_nombre}<br>"
-                
-                if nivel == 'SECCION':
-                    seccion = row.get('SECCION', 'N/A')
-                    text += f"Sección: {seccion}<br>"
-                
-                text += (
-                    f"<br>"
-                    f"Prioridad: {prioridad:.1f}<br>"
-                    f"Competitividad: {competitividad:.1f}"
-                )
-                hover_text.append(text)
-            
-            fig.add_trace(go.Choroplethmapbox(
-                geojson=json.loads(df_tipo.to_json()),
-                locations=df_tipo['id'],
-                z=[1] * len(df_tipo),
-                colorscale=[[0, color], [1, color]],
-                showscale=False,
-                marker_line_width=0.2 if nivel == 'SECCION' else 0,
-                marker_line_color='rgba(50,50,50,0.3)' if nivel == 'SECCION' else 'rgba(0,0,0,0)',
-                marker_opacity=opacidad,
-                hovertext=hover_text,
-                hoverinfo='text',
-                name=tipo.replace('_', ' ').title()
-            ))
+        df_tipo = gdf_plot[gdf_plot['TIPO_SECCION_ESTRATEGICA'].isin(tipos_presentes)]
+        
+        hover = [
+            ('Prioridad: %{v:.1f}', self._columna_o_cero(df_tipo, 'PRIORIDAD_MOVILIZACION')),
+            ('Competitividad: %{v:.1f}', self._columna_o_cero(df_tipo, 'COMPETITIVIDAD'))
+        ]
+        
+        self._agregar_capa_categorica(
+            fig, df_tipo, geojson, 'TIPO_SECCION_ESTRATEGICA', tipos_presentes,
+            [COLORES_TIPO_SECCION.get(t, '#888888') for t in tipos_presentes],
+            [t.replace('_', ' ').title() for t in tipos_presentes], hover, nivel, opacidad
+        )
         
         estado_nombre = ESTADOS.get(estado_id, 'Nacional') if estado_id else 'Nacional'
         
@@ -1018,7 +2382,7 @@ class VisualizadorElectoral:
         
         return fig
 
-    def _crear_mapa_tendencia(self, gdf_plot, metrica, nivel, estado_id, opacidad=0.65):
+    def _crear_mapa_tendencia(self, gdf_plot, geojson, metrica, nivel, estado_id, opacidad=0.65):
         center_coords = COORDS_ESTADOS.get(estado_id, {'lat': 23.6345, 'lon': -102.5528})
         zoom_level = 7 if estado_id else 4
         
@@ -1041,51 +2405,21 @@ class VisualizadorElectoral:
         tendencias_presentes = gdf_plot[metrica].dropna().unique()
         tendencias_presentes = [t for t in orden_tendencias if t in tendencias_presentes]
         
-        for tendencia in tendencias_presentes:
-            df_tend = gdf_plot[gdf_plot[metrica] == tendencia]
-            
-            if len(df_tend) == 0:
-                continue
-            
-            color = COLORES_TENDENCIA.get(tendencia, '#888888')
-            
-            hover_text = []
-            votos_2024_col = f'{partido}_2024'
-            votos_2018_col = f'{partido}_2018'
-            
-            for idx, row in df_tend.iterrows():
-                estado_nombre = ESTADOS.get(row.get('ID_ENTIDAD'), 'N/A')
-                votos_2024 = row.get(votos_2024_col, 0)
-                votos_2018 = row.get(votos_2018_col, 0)
-                cambio = votos_2024 - votos_2018
-                
-                text = f"<b>{tendencia.replace('_', ' ')}</b><br>Estado: {estado_nombre}<br>"
-                
-                if nivel == 'SECCION':
-                    seccion = row.get('SECCION', 'N/A')
-                    text += f"Sección: {seccion}<br>"
-                
-                text += (
-                    f"<br>"
-                    f"Votos 2024: {votos_2024:,.0f}<br>"
-                    f"Votos 2018: {votos_2018:,.0f}<br>"
-                    f"Cambio: {cambio:+,.0f}"
-                )
-                hover_text.append(text)
-            
-            fig.add_trace(go.Choroplethmapbox(
-                geojson=json.loads(df_tend.to_json()),
-                locations=df_tend['id'],
-                z=[1] * len(df_tend),
-                colorscale=[[0, color], [1, color]],
-                showscale=False,
-                marker_line_width=0.2 if nivel == 'SECCION' else 0,
-                marker_line_color='rgba(50,50,50,0.3)' if nivel == 'SECCION' else 'rgba(0,0,0,0)',
-                marker_opacity=opacidad,
-                hovertext=hover_text,
-                hoverinfo='text',
-                name=tendencia.replace('_', ' ').title()
-            ))
+        df_tend = gdf_plot[gdf_plot[metrica].isin(tendencias_presentes)]
+        
+        votos_2024 = self._columna_o_cero(df_tend, f'{partido}_2024')
+        votos_2018 = self._columna_o_cero(df_tend, f'{partido}_2018')
+        hover = [
+            ('Votos 2024: %{v:,.0f}', votos_2024),
+            ('Votos 2018: %{v:,.0f}', votos_2018),
+            ('Cambio: %{v:+,.0f}', votos_2024 - votos_2018)
+        ]
+        
+        self._agregar_capa_categorica(
+            fig, df_tend, geojson, metrica, tendencias_presentes,
+            [COLORES_TENDENCIA.get(t, '#888888') for t in tendencias_presentes],
+            [t.replace('_', ' ').title() for t in tendencias_presentes], hover, nivel, opacidad
+        )
         
         estado_nombre = ESTADOS.get(estado_id, 'Nacional') if estado_id else 'Nacional'
         
@@ -1120,12 +2454,12 @@ class VisualizadorElectoral:
         return fig
 
     def generar_estadisticas(self, nivel='SECCION', estado_id=None, metrica=None):
-        # OPTIMIZACIÓN: Validar que haya estado
-        if estado_id is None:
-            return {}
+        # Sin estado: estadísticas del rollup nacional
+        if not estado_id:
+            estado_id, nivel = None, self.nivel_nacional(nivel)
         
         try:
-            df = self.agregar_por_nivel(nivel, estado_id)
+            df = self.agregar_atributos(nivel, estado_id)
         except Exception as e:
             print(f"⚠️ Error al generar estadísticas: {e}")
             return {}
@@ -1169,19 +2503,23 @@ class VisualizadorElectoral:
         
         party_cols_2024 = [f"{p}_2024" for p in base_parties if f"{p}_2024" in df.columns]
         if party_cols_2024:
-            votos_por_partido = {col.replace('_2024', ''): df[col].sum() for col in party_cols_2024}
-            votos_por_partido = {k: v for k, v in votos_por_partido.items() if v > 0}
+            # Mismo kernel que el mapa, aplicado a los totales del estado (una sola fila)
+            totales = calcular_ranking(
+                df[party_cols_2024].sum().to_numpy()[np.newaxis, :],
+                [c.replace('_2024', '') for c in party_cols_2024]
+            )
             
-            if votos_por_partido:
-                partido_ganador = max(votos_por_partido, key=votos_por_partido.get)
-                partidos_ordenados = sorted(votos_por_partido.items(), key=lambda x: x[1], reverse=True)
+            if totales['votos_ganador'][0] > 0:
+                stats['ganador_partido'] = totales['ganador'][0]
+                stats['votos_ganador_partido'] = totales['votos_ganador'][0]
                 
-                stats['ganador_partido'] = partido_ganador
-                stats['votos_ganador_partido'] = votos_por_partido[partido_ganador]
+                # Unidades territoriales donde gana cada partido (ranking por unidad)
+                ranking = self.ranking_partidos(nivel, estado_id, '2024', df=df)
+                stats['unidades_por_ganador'] = ranking['GANADOR'].value_counts().to_dict()
                 
-                if len(partidos_ordenados) > 1:
-                    stats['segundo_partido'] = partidos_ordenados[1][0]
-                    stats['votos_segundo_partido'] = partidos_ordenados[1][1]
+                if totales['votos_segundo'][0] > 0:
+                    stats['segundo_partido'] = totales['segundo'][0]
+                    stats['votos_segundo_partido'] = totales['votos_segundo'][0]
                     stats['margen_victoria_partido'] = stats['votos_ganador_partido'] - stats['votos_segundo_partido']
                     stats['margen_victoria_pct_partido'] = (
                         stats['margen_victoria_partido'] / stats['votos_ganador_partido'] * 100
@@ -1225,7 +2563,7 @@ def crear_app(visualizador):
     
     # OPTIMIZACIÓN: Detectar columnas disponibles sin cargar todos los datos
     try:
-        columnas_csv = pd.read_csv(visualizador.csv_path, nrows=0).columns.tolist()
+        columnas_csv = visualizador.get_available_columns()
         print(f"   ✓ Columnas detectadas: {len(columnas_csv)}")
     except Exception as e:
         print(f"   ⚠️ Error detectando columnas: {e}")
@@ -1347,9 +2685,10 @@ def crear_app(visualizador):
                         ], className="fw-bold mb-2"),
                         dcc.Dropdown(
                             id='dropdown-estado',
-                            options=[{'label': nombre, 'value': id_est} 
-                                     for id_est, nombre in sorted(ESTADOS.items(), key=lambda x: x[1])
-                                     if id_est in estados_disponibles],  # OPTIMIZACIÓN: Solo disponibles
+                            options=[{'label': '🇲🇽 Nacional', 'value': 0}] + [
+                                {'label': nombre, 'value': id_est}
+                                for id_est, nombre in sorted(ESTADOS.items(), key=lambda x: x[1])
+                                if id_est in estados_disponibles],  # OPTIMIZACIÓN: Solo disponibles
                             value=estados_disponibles[0] if estados_disponibles else 1,  # Primer estado disponible
                             clearable=False,
                             placeholder="Selecciona un estado...",
@@ -1533,7 +2872,10 @@ def crear_app(visualizador):
                     "Visualizador Electoral México 2024 | Datos Oficiales INE"
                 ], className="text-center text-muted small")
             ], width=12)
-        ])
+        ]),
+        
+        # Parámetros y resolución del mapa mostrado (para cambiar de geometría al hacer zoom)
+        dcc.Store(id='store-vista')
         
     ], fluid=True, style={'backgroundColor': '#ECF0F1', 'minHeight': '100vh', 'padding': '20px'})
     
@@ -1599,54 +2941,278 @@ def crear_app(visualizador):
             style={'padding': '10px', 'border': '1px solid #dee2e6'}
         )
     
+    # Un callback por salida: el navegador los pide en paralelo y cada uno se pinta
+    # al terminar, así estadísticas y gráficos no esperan al mapa (el más lento).
+    # Comparten el estado/nivel ya cargado a través de los caches del visualizador.
+    
+    def nivel_efectivo(estado_id, nivel):
+        """Estado 0 = vista nacional (rollups por estado o por distrito federal)"""
+        return visualizador.nivel_nacional(nivel) if estado_id == 0 else nivel
+    
     @app.callback(
         [Output('mapa-principal', 'figure'),
-         Output('panel-estadisticas', 'children'),
-         Output('grafico-partidos', 'figure'),
-         Output('grafico-participacion', 'figure')],
+         Output('store-vista', 'data')],
         [Input('btn-actualizar', 'n_clicks')],
         [State('dropdown-estado', 'value'),
          State('dropdown-nivel', 'value'),
          State('dropdown-metrica', 'value'),
          State('switch-ganador', 'value'),
-         State('slider-opacidad', 'value')]
+         State('slider-opacidad', 'value'),
+         State('store-vista', 'data')]
     )
-    def actualizar_visualizacion(n_clicks, estado_id, nivel, metrica, mostrar_ganador, opacidad):
+    def actualizar_visualizacion(n_clicks, estado_id, nivel, metrica, mostrar_ganador, opacidad, vista):
         # OPTIMIZACIÓN: Validar que haya estado seleccionado
-        if estado_id is None or estado_id == 0:
-            return (
-                go.Figure().add_annotation(
-                    text="⚠️ Selecciona un estado para comenzar",
-                    xref="paper", yref="paper", x=0.5, y=0.5,
-                    showarrow=False, font=dict(size=20, color='orange')
-                ),
-                [dbc.Col([html.P("Selecciona un estado", className="text-muted")], width=12)],
-                go.Figure(),
-                go.Figure()
-            )
+        if estado_id is None:
+            return figura_aviso("⚠️ Selecciona un estado para comenzar"), None
+        if estado_id == 0 and not visualizador.nacional_disponible():
+            return figura_aviso(f"⚠️ {MENSAJE_NACIONAL}", tamano=14), None
         
         mostrar_ganador = len(mostrar_ganador) > 0 if mostrar_ganador else False
+        nivel = nivel_efectivo(estado_id, nivel)
+        
+        # Mismas entradas y mismos datos = misma salida: se sirven ya serializadas.
+        # La opacidad no es parte de la llave: se cachea una sola copia y se ajusta al servirla
+        fig_mapa = visualizador.cache_figuras.memorizar(
+            ('mapa', estado_id, nivel, metrica, mostrar_ganador), visualizador.version_datos(),
+            lambda: visualizador.crear_mapa(
+                metrica=metrica,
+                nivel=nivel,
+                estado_id=estado_id,
+                mostrar_ganador=mostrar_ganador
+            )
+        )
+        aplicar_opacidad(fig_mapa, opacidad)
+        continuo = es_mapa_continuo(fig_mapa)
+        
+        # Solo cambió la métrica entre dos mapas continuos: se parchan z, escala y título.
+        # El GeoJSON y la vista del usuario no cambian.
+        solo_metrica = (
+            vista is not None and vista.get('continuo') and continuo
+            and vista['metrica'] != metrica
+            and (vista['estado_id'], vista['nivel'], vista['mostrar_ganador']) == (estado_id, nivel, mostrar_ganador)
+        )
+        if solo_metrica:
+            return parche_metrica(fig_mapa), {**vista, 'metrica': metrica}
         
-        fig_mapa = visualizador.crear_mapa(
-            metrica=metrica,
-            nivel=nivel,
-            estado_id=estado_id,
-            mostrar_ganador=mostrar_ganador,
-            opacidad=opacidad
+        vista = {
+            'estado_id': estado_id, 'nivel': nivel, 'metrica': metrica,
+            'mostrar_ganador': mostrar_ganador, 'continuo': continuo,
+            'tolerancia': tolerancia_para_zoom(7 if estado_id else 4)
+        }
+        
+        return fig_mapa, vista
+    
+    @app.callback(
+        Output('panel-estadisticas', 'children'),
+        Input('btn-actualizar', 'n_clicks'),
+        [State('dropdown-estado', 'value'),
+         State('dropdown-nivel', 'value'),
+         State('dropdown-metrica', 'value')]
+    )
+    def actualizar_estadisticas(n_clicks, estado_id, nivel, metrica):
+        if estado_id is None:
+            return [dbc.Col([html.P("Selecciona un estado", className="text-muted")], width=12)]
+        if estado_id == 0 and not visualizador.nacional_disponible():
+            return [dbc.Col([html.P(MENSAJE_NACIONAL, className="text-muted")], width=12)]
+        
+        nivel = nivel_efectivo(estado_id, nivel)
+        return visualizador.cache_figuras.memorizar(
+            ('panel', estado_id, nivel, metrica), visualizador.version_datos(),
+            lambda: crear_panel_estadisticas(visualizador.generar_estadisticas(nivel, estado_id, metrica))
         )
+    
+    @app.callback(
+        Output('grafico-partidos', 'figure'),
+        Input('btn-actualizar', 'n_clicks'),
+        [State('dropdown-estado', 'value'),
+         State('dropdown-nivel', 'value')]
+    )
+    def actualizar_grafico_partidos(n_clicks, estado_id, nivel):
+        if estado_id is None or estado_id == 0 and not visualizador.nacional_disponible():
+            return go.Figure()
+        
+        nivel = nivel_efectivo(estado_id, nivel)
+        return visualizador.cache_figuras.memorizar(
+            ('partidos', estado_id, nivel), visualizador.version_datos(),
+            lambda: crear_grafico_partidos(visualizador, nivel, estado_id)
+        )
+    
+    @app.callback(
+        Output('grafico-participacion', 'figure'),
+        Input('btn-actualizar', 'n_clicks'),
+        [State('dropdown-estado', 'value'),
+         State('dropdown-nivel', 'value')]
+    )
+    def actualizar_grafico_participacion(n_clicks, estado_id, nivel):
+        if estado_id is None or estado_id == 0 and not visualizador.nacional_disponible():
+            return go.Figure()
+        
+        nivel = nivel_efectivo(estado_id, nivel)
+        return visualizador.cache_figuras.memorizar(
+            ('participacion', estado_id, nivel), visualizador.version_datos(),
+            lambda: crear_grafico_participacion(visualizador, nivel, estado_id)
+        )
+    
+    @app.callback(
+        [Output('mapa-principal', 'figure', allow_duplicate=True),
+         Output('store-vista', 'data', allow_duplicate=True)],
+        Input('mapa-principal', 'relayoutData'),
+        State('store-vista', 'data'),
+        State('slider-opacidad', 'value'),
+        prevent_initial_call=True
+    )
+    def cambiar_resolucion(relayout, vista, opacidad):
+        """Al hacer zoom, reenvía el mapa solo si cambia el nivel de la pirámide de geometría"""
+        if not vista or not relayout or 'mapbox.zoom' not in relayout:
+            raise PreventUpdate
         
-        stats = visualizador.generar_estadisticas(nivel, estado_id, metrica)
-        panel_stats = crear_panel_estadisticas(stats)
-        fig_partidos = crear_grafico_partidos(visualizador, nivel, estado_id)
-        fig_participacion = crear_grafico_participacion(visualizador, nivel, estado_id)
+        zoom = relayout['mapbox.zoom']
+        tolerancia = tolerancia_para_zoom(zoom)
+        if tolerancia == vista['tolerancia']:
+            raise PreventUpdate
         
-        return fig_mapa, panel_stats, fig_partidos, fig_participacion
+        fig_mapa = visualizador.crear_mapa(
+            metrica=vista['metrica'],
+            nivel=vista['nivel'],
+            estado_id=vista['estado_id'],
+            mostrar_ganador=vista['mostrar_ganador'],
+            opacidad=opacidad,
+            zoom=zoom,
+            centro=relayout.get('mapbox.center')
+        )
+        
+        return fig_mapa, {**vista, 'tolerancia': tolerancia}
+    
+    # La transparencia es solo presentación: se aplica en el navegador sobre la
+    # figura que ya está cargada (sin ir al servidor ni reenviar geometría)
+    app.clientside_callback(
+        """
+        function(opacidad, figura) {
+            if (!figura || !figura.data) {
+                return window.dash_clientside.no_update;
+            }
+            const data = figura.data.map(function(traza) {
+                if (traza.type !== 'choroplethmapbox') {
+                    return traza;
+                }
+                const marker = Object.assign({}, traza.marker, {opacity: opacidad});
+                return Object.assign({}, traza, {marker: marker});
+            });
+            const figuraNueva = Object.assign({}, figura, {data: data});
+            const mapbox = figura.layout && figura.layout.mapbox;
+            if (mapbox && mapbox.layers) {
+                const layers = mapbox.layers.map(function(capa) {
+                    return capa.type === 'fill' ? Object.assign({}, capa, {opacity: opacidad}) : capa;
+                });
+                figuraNueva.layout = Object.assign({}, figura.layout, {
+                    mapbox: Object.assign({}, mapbox, {layers: layers})
+                });
+            }
+            return figuraNueva;
+        }
+        """,
+        Output('mapa-principal', 'figure', allow_duplicate=True),
+        Input('slider-opacidad', 'value'),
+        State('mapa-principal', 'figure'),
+        prevent_initial_call=True
+    )
+    
+    # GeoJSON de geometría servido aparte: las figuras solo llevan su URL y los valores
+    visualizador.url_geojson = '/geojson'
+    tolerancias = {0.0} | {tolerancia for _, tolerancia in PIRAMIDE_GEOMETRIA}
+    
+    niveles = ['SECCION', 'MUNICIPIO', 'DISTRITO_FEDERAL', 'DISTRITO_LOCAL']
+    
+    @app.server.route('/geojson/<int:estado_id>/<nivel>/<float:tolerancia>.json')
+    def servir_geojson(estado_id, nivel, tolerancia):
+        # Estado 0 = vista nacional
+        nacional = estado_id == 0 and nivel in NIVELES_NACIONALES
+        if not (nacional or estado_id in ESTADOS and nivel in niveles) or tolerancia not in tolerancias:
+            abort(404)
+        if nacional and not visualizador.nacional_disponible():
+            abort(404)
+        
+        texto, version = visualizador.geojson_nivel(nivel, estado_id or None, tolerancia)
+        respuesta = Response(texto, mimetype='application/json')
+        # La URL lleva la versión (hash del contenido): se puede cachear indefinidamente
+        respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        respuesta.headers['ETag'] = version
+        return respuesta
+    
+    # Teselas vectoriales (MVT) para mapas de secciones grandes
+    visualizador.url_teselas = '/tiles'
+    metricas_validas = set(metricas_disponibles)
+    
+    @app.server.route('/tiles/<nivel>/<int:z>/<int:x>/<int:y>.pbf')
+    def servir_tesela(nivel, z, x, y):
+        estado_id = request.args.get('estado', type=int)
+        if estado_id not in ESTADOS or nivel not in niveles:
+            abort(404)
+        # Fuera de la pirámide no hay tesela (y 2**z desborda el cálculo de sus límites)
+        if z > ZOOM_MAX_TESELAS or x >= 2 ** z or y >= 2 ** z:
+            abort(404)
+        if 'clase' in request.args and 'metrica' not in request.args:
+            abort(400)
+        # Cada métrica construye y cachea sus clases: solo las que ofrece la app
+        if 'metrica' in request.args and request.args['metrica'] not in metricas_validas:
+            abort(404)
+        
+        datos = visualizador.tesela(
+            nivel, estado_id, z, x, y,
+            clase=request.args.get('clase', type=int),
+            metrica=request.args.get('metrica'),
+            mostrar_ganador=request.args.get('ganador') == '1'
+        )
+        respuesta = Response(datos, mimetype='application/vnd.mapbox-vector-tile')
+        respuesta.headers['Cache-Control'] = 'public, max-age=3600'
+        return respuesta
     
     return app
 
 # ============================================================================
 # FUNCIONES AUXILIARES
 # ============================================================================
+def figura_aviso(texto, tamano=20):
+    """Figura vacía con un aviso centrado (en lugar del mapa)"""
+    return go.Figure().add_annotation(
+        text=texto,
+        xref="paper", yref="paper", x=0.5, y=0.5,
+        showarrow=False, font=dict(size=tamano, color='orange')
+    )
+
+
+def es_mapa_continuo(fig):
+    """True si el mapa (figura serializada) es de una métrica continua: una sola traza con escala de color"""
+    return len(fig['data']) == 1 and fig['data'][0].get('type') == 'choroplethmapbox'
+
+
+def aplicar_opacidad(fig, opacidad):
+    """Opacidad del slider sobre el mapa serializado (igual que el callback del navegador):
+    marker.opacity de los coropletas y opacity de las capas de relleno en modo teselas"""
+    if opacidad is None:
+        return fig
+    for traza in fig['data']:
+        if traza.get('type') == 'choroplethmapbox':
+            traza.setdefault('marker', {})['opacity'] = opacidad
+    for capa in fig['layout'].get('mapbox', {}).get('layers', []):
+        if capa.get('type') == 'fill':
+            capa['opacity'] = opacidad
+    return fig
+
+
+def parche_metrica(fig):
+    """Actualización parcial del mapa continuo que ya está en el navegador: valores, hover,
+    escala de color y título de `fig` (serializada), sin tocar geojson, locations ni la vista"""
+    traza = fig['data'][0]
+    parche = Patch()
+    parche['data'][0]['z'] = traza.get('z')
+    parche['data'][0]['customdata'] = traza.get('customdata')
+    parche['data'][0]['hovertemplate'] = traza.get('hovertemplate')
+    parche['layout']['coloraxis'] = fig['layout'].get('coloraxis', {})
+    parche['layout']['title'] = fig['layout'].get('title', {})
+    return parche
+
+
 def crear_panel_estadisticas(stats):
     if not stats:
         return [dbc.Col([html.P("No hay datos disponibles", className="text-muted")], width=12)]
@@ -1728,7 +3294,12 @@ def crear_panel_estadisticas(stats):
                     html.H6([html.I(className="fas fa-map-marked me-2"), "Unidades Territoriales"], 
                            className="text-muted mb-2"),
                     html.H3(f"{stats['num_secciones']:,}", className="text-info mb-0"),
-                    html.Small("Total analizadas", className="text-muted")
+                    html.Small(
+                        f"Total analizadas · {stats['ganador_partido']} gana en "
+                        f"{stats['unidades_por_ganador'].get(stats['ganador_partido'], 0):,}"
+                        if stats.get('unidades_por_ganador') else "Total analizadas",
+                        className="text-muted"
+                    )
                 ])
             ], className="border-start border-info border-4 shadow-sm")
         ], width=12, md=6, lg=4, className="mb-3"),
@@ -1753,7 +3324,7 @@ def crear_panel_estadisticas(stats):
     return cards
 
 def crear_grafico_partidos(visualizador, nivel, estado_id):
-    df = visualizador.agregar_por_nivel(nivel, estado_id)
+    df = visualizador.agregar_atributos(nivel, estado_id)
     
     if len(df) == 0:
         return go.Figure().add_annotation(
@@ -1847,7 +3418,7 @@ def crear_grafico_partidos(visualizador, nivel, estado_id):
     return fig
 
 def crear_grafico_participacion(visualizador, nivel, estado_id):
-    df = visualizador.agregar_por_nivel(nivel, estado_id)
+    df = visualizador.agregar_atributos(nivel, estado_id)
     participacion_col = 'PARTICIPACION_PCT'
     
     if len(df) == 0 or participacion_col not in df.columns:
@@ -1924,6 +3495,14 @@ BASE_DIR = Path(__file__).resolve().parent
 # ⭐ INICIALIZACIÓN OPTIMIZADA (PARA DEPLOY)
 CSV_PATH = os.getenv('CSV_PATH', 'data/maestro_electoral_con_metricascorregido.csv')
 SHP_PATH = os.getenv('SHP_PATH', 'data/SECCION.shp')
+PARQUET_DIR = os.getenv('PARQUET_DIR')  # Por defecto: <carpeta del CSV>/maestro_por_estado
+CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', 1024))  # Presupuesto de memoria del cache de estados
+DISOLVER_WORKERS = int(os.getenv('DISOLVER_WORKERS', 1))  # Procesos para disolver municipios/distritos (solo construir)
+GEOJSON_DECIMALES = int(os.getenv('GEOJSON_DECIMALES', 5))  # Precisión de coordenadas en el navegador
+TESELAS_DESDE = int(os.getenv('TESELAS_DESDE')) if os.getenv('TESELAS_DESDE') else None  # Secciones para usar MVT
+CACHE_FIGURAS_MB = int(os.getenv('CACHE_FIGURAS_MB', 256))  # Memoria para figuras ya serializadas
+CACHE_FIGURAS_DIR = os.getenv('CACHE_FIGURAS_DIR')  # Segundo nivel en disco (opcional, compartido)
+PRECARGAR_ESTADOS = os.getenv('PRECARGAR_ESTADOS', '')  # 'todos' o IDs separados por coma (usar con --preload)
 HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 8050))
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
@@ -1933,10 +3512,25 @@ print(f"   📂 CSV: {CSV_PATH}")
 print(f"   📂 SHP: {SHP_PATH}")
 
 # Crear visualizador SIN cargar datos (lazy loading)
-visualizador = VisualizadorElectoral(CSV_PATH, SHP_PATH)
+visualizador = VisualizadorElectoral(
+    CSV_PATH, SHP_PATH, parquet_dir=PARQUET_DIR,
+    cache_max_mb=CACHE_MAX_MB, workers_disolucion=DISOLVER_WORKERS,
+    decimales_geojson=GEOJSON_DECIMALES, teselas_desde=TESELAS_DESDE,
+    cache_figuras_mb=CACHE_FIGURAS_MB, dir_figuras=CACHE_FIGURAS_DIR
+)
 
 print("✅ Aplicación lista (datos se cargarán bajo demanda)")
 
+if PRECARGAR_ESTADOS:
+    if PRECARGAR_ESTADOS.strip().lower() == 'todos':
+        estados_precarga = visualizador.get_available_states()
+    else:
+        estados_precarga = [int(e) for e in PRECARGAR_ESTADOS.split(',') if e.strip()]
+    visualizador.precargar(estados_precarga)
+    # Sacar lo precargado del recolector de basura: si el GC de cada worker recorre
+    # esos objetos escribe en sus páginas y el copy-on-write las termina duplicando
+    gc.freeze()
+
 app = crear_app(visualizador)
 server = app.server  # Expuesto para Gunicorn
 
@@ -1946,6 +3540,17 @@ server = app.server  # Expuesto para Gunicorn
 if __name__ == '__main__':
     import sys
     
+    # Paso offline: python Visualizacion.py particionar
+    if len(sys.argv) > 1 and sys.argv[1] == 'particionar':
+        visualizador.particionar_csv()
+        visualizador.particionar_shapefile()
+        sys.exit(0)
+    
+    # Paso offline: python Visualizacion.py construir [estado ...]
+    if len(sys.argv) > 1 and sys.argv[1] == 'construir':
+        visualizador.construir_artefactos([int(e) for e in sys.argv[2:]] or None)
+        sys.exit(0)
+    
     print("="*80)
     print("🗳️  VISUALIZADOR ELECTORAL MÉXICO")
     print("="*80)
@@ -1954,13 +3559,15 @@ if __name__ == '__main__':
     
     archivos_ok = True
     
-    if not os.path.exists(CSV_PATH):
+    if os.path.exists(CSV_PATH):
+        tamano_mb = os.path.getsize(CSV_PATH) / (1024 * 1024)
+        print(f"✅ CSV encontrado ({tamano_mb:.2f} MB)")
+    elif visualizador.usa_parquet():
+        print(f"✅ Almacén Parquet encontrado ({visualizador.parquet_dir})")
+    else:
         print(f"❌ ERROR: No se encuentra el archivo CSV")
         print(f"   Ruta buscada: {CSV_PATH}")
         archivos_ok = False
-    else:
-        tamano_mb = os.path.getsize(CSV_PATH) / (1024 * 1024)
-        print(f"✅ CSV encontrado ({tamano_mb:.2f} MB)")
     
     if not os.path.exists(SHP_PATH):
         print(f"❌ ERROR: No se encuentra el archivo SHP")
@@ -1983,7 +3590,7 @@ if __name__ == '__main__':
     print(f"\n✅ APLICACIÓN INICIALIZADA (modo optimizado)")
     print("="*80)
     print(f"📊 Modo: Carga bajo demanda por estado")
-    print(f"💾 Cache: Hasta {visualizador.max_cache} estados en memoria simultáneos")
+    print(f"💾 Cache: Hasta {CACHE_MAX_MB} MB de estados en memoria (LRU)")
     print(f"📁 CSV disponible: {CSV_PATH}")
     print(f"📁 SHP disponible: {SHP_PATH}")
     
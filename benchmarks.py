@@ -0,0 +1,167 @@
+"""Micro-benchmarks de las rutas calientes del visualizador.
+
+Uso:
+    python benchmarks.py                 # todos
+    python benchmarks.py coaliciones     # solo uno
+
+Cada benchmark compara la implementación actual con la versión anterior
+(fila por fila o secuencial) y verifica que ambas den el mismo resultado.
+"""
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box
+
+from Visualizacion import (VisualizadorElectoral, disolver_cobertura, disolver_grupo, geojson_compacto,
+                           simplificar_cobertura, TOLERANCIA_LIMITES)
+
+
+def _cronometrar(funcion, repeticiones=3):
+    """Mejor tiempo (segundos) de varias ejecuciones"""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def _reportar(nombre, t_antes, t_despues):
+    print(f"{nombre:<28} antes: {t_antes * 1000:9.1f} ms | ahora: {t_despues * 1000:9.1f} ms "
+          f"| x{t_antes / t_despues:,.1f}")
+
+
+def _secciones_sinteticas(n=70_000, semilla=0):
+    """DataFrame con votos 2024 por partido y coalición, con empates y filas vacías"""
+    rng = np.random.default_rng(semilla)
+    columnas = ['PAN', 'PRI', 'PRD', 'PVEM', 'PT', 'MC', 'MORENA', 'PAN_PRI_PRD', 'PVEM_PT_MORENA']
+    df = pd.DataFrame(rng.integers(0, 400, size=(n, len(columnas))), columns=[f'{c}_2024' for c in columnas])
+    df.iloc[::97] = 0  # secciones sin votos
+    df.iloc[1::89, :] = 50  # empates
+    return df
+
+
+def bench_coaliciones():
+    df = _secciones_sinteticas()
+    visualizador = VisualizadorElectoral.__new__(VisualizadorElectoral)
+
+    def anterior():
+        resultado = visualizador.calcular_coaliciones(df.copy())
+
+        def determinar_ganador_coalicion(row):
+            votos = {
+                'COALICION_OPOSITORA': row.get('COALICION_OPOSITORA', 0),
+                'COALICION_OFICIALISTA': row.get('COALICION_OFICIALISTA', 0),
+                'MC': row.get('MC_TOTAL', 0)
+            }
+            return max(votos, key=votos.get) if max(votos.values()) > 0 else 'SIN_DATOS'
+
+        return resultado.apply(determinar_ganador_coalicion, axis=1)
+
+    t_antes, esperado = _cronometrar(anterior, repeticiones=1)
+    t_despues, obtenido = _cronometrar(lambda: visualizador.calcular_coaliciones(df.copy())['GANADOR_COALICION'])
+
+    assert (esperado.to_numpy() == obtenido.to_numpy()).all(), "GANADOR_COALICION difiere"
+    _reportar(f'coaliciones ({len(df):,} filas)', t_antes, t_despues)
+
+
+def _cuadricula_secciones(lado=120, tam_grupo=6, semilla=0):
+    """Secciones cuadradas con pequeños huecos entre ellas, agrupadas en bloques (municipios)"""
+    rng = np.random.default_rng(semilla)
+    paso = 0.01
+    filas = []
+    for i in range(lado):
+        for j in range(lado):
+            hueco = rng.uniform(0, 0.0003)
+            filas.append({
+                'MUNICIPIO': (i // tam_grupo) * (lado // tam_grupo + 1) + j // tam_grupo,
+                'geometry': box(i * paso, j * paso, (i + 1) * paso - hueco, (j + 1) * paso - hueco)
+            })
+    return gpd.GeoDataFrame(filas, geometry='geometry', crs='EPSG:4326')
+
+
+def bench_disolucion():
+    gdf = _cuadricula_secciones()
+    # Al menos 2 procesos para que siempre se verifique la ruta paralela
+    workers = int(os.getenv('DISOLVER_WORKERS', max(2, os.cpu_count() or 1)))
+    disolver = VisualizadorElectoral._disolver_geometrias
+
+    t_antes, esperado = _cronometrar(lambda: disolver(gdf, ['MUNICIPIO'], workers=1), repeticiones=1)
+    t_despues, obtenido = _cronometrar(lambda: disolver(gdf, ['MUNICIPIO'], workers=workers), repeticiones=1)
+
+    assert esperado['MUNICIPIO'].equals(obtenido['MUNICIPIO']), "Orden de grupos distinto"
+    assert esperado.geometry.geom_equals_exact(obtenido.geometry, 0).all(), "Geometrías distintas"
+    _reportar(f'disolución ({esperado.shape[0]} grupos, {workers} procesos)', t_antes, t_despues)
+
+
+def _teselado_secciones(n=20_000, bloques=20, semilla=0):
+    """Secciones de Voronoi que cubren un cuadro de 2°x2° sin huecos, agrupadas en bloques"""
+    rng = np.random.default_rng(semilla)
+    extension = box(0, 0, 2, 2)
+    puntos = shapely.multipoints(rng.uniform(0, 2, size=(n, 2)))
+    celdas = shapely.get_parts(shapely.voronoi_polygons(puntos, extend_to=extension))
+    celdas = shapely.intersection(celdas, extension)
+    centros = shapely.get_coordinates(shapely.centroid(celdas))
+    grupo = (centros[:, 0] // (2 / bloques)).astype(int) * bloques + (centros[:, 1] // (2 / bloques)).astype(int)
+    return gpd.GeoDataFrame({'MUNICIPIO': grupo, 'geometry': celdas}, crs='EPSG:4326')
+
+
+def bench_cobertura():
+    gdf = _teselado_secciones()
+    disolver = VisualizadorElectoral._disolver_geometrias
+    exacto = gdf.dissolve('MUNICIPIO').geometry.reset_index(drop=True)
+
+    # Antes: secciones simplificadas (como en load_state) + buffer/unary_union/buffer negativo
+    simplificadas = gdf.assign(geometry=gdf.geometry.simplify(0.001, preserve_topology=True))
+    t_antes, antes = _cronometrar(lambda: disolver(simplificadas, ['MUNICIPIO'], metodo=disolver_grupo), repeticiones=1)
+
+    def cobertura():
+        limites = disolver(gdf, ['MUNICIPIO'], metodo=disolver_cobertura)
+        limites['geometry'] = simplificar_cobertura(limites.geometry, TOLERANCIA_LIMITES)
+        return limites
+
+    t_despues, ahora = _cronometrar(cobertura, repeticiones=1)
+
+    _reportar(f'cobertura ({len(gdf):,} secciones)', t_antes, t_despues)
+    for nombre, resultado in [('antes', antes), ('ahora', ahora)]:
+        vertices = shapely.get_num_coordinates(np.asarray(resultado.geometry)).sum()
+        error_area = (resultado.geometry.symmetric_difference(exacto).area.sum() / exacto.area.sum()) * 100
+        traslapes = resultado.geometry.area.sum() - shapely.union_all(np.asarray(resultado.geometry)).area
+        print(f"   {nombre:<6} vértices: {vertices:,} | diferencia vs. unión exacta: {error_area:.3f}% "
+              f"| traslape entre municipios: {traslapes:.2e}°²")
+
+
+def bench_geojson():
+    gdf = _teselado_secciones()
+    # Columnas de atributos como las que arrastra gdf_plot al convertir a GeoJSON
+    rng = np.random.default_rng(0)
+    atributos = pd.DataFrame(rng.uniform(0, 1000, size=(len(gdf), 100)),
+                             columns=[f'COL_{i}' for i in range(100)])
+    gdf = pd.concat([gdf, atributos], axis=1)
+
+    t_antes, antes = _cronometrar(lambda: json.dumps(json.loads(gdf.to_json())), repeticiones=1)
+    t_despues, ahora = _cronometrar(lambda: json.dumps(geojson_compacto(gdf.geometry, gdf.index)))
+
+    _reportar(f'geojson ({len(gdf):,} secciones)', t_antes, t_despues)
+    print(f"   payload antes: {len(antes) / 2**20:.1f} MB | ahora: {len(ahora) / 2**20:.1f} MB "
+          f"| x{len(antes) / len(ahora):,.1f}")
+
+
+BENCHMARKS = {
+    'coaliciones': bench_coaliciones,
+    'disolucion': bench_disolucion,
+    'cobertura': bench_cobertura,
+    'geojson': bench_geojson,
+}
+
+
+if __name__ == '__main__':
+    seleccion = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in seleccion:
+        BENCHMARKS[nombre]()